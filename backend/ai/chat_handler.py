@@ -6,18 +6,257 @@ to manipulate assignments, tasks, and calendar events.
 """
 
 import google.generativeai as genai
-import json
-from typing import List, Dict, Any, Optional
+from google.generativeai import client as genai_client
+from google.protobuf.json_format import MessageToDict
+import asyncio
+import hashlib
+import logging
+import re
+import time
+import traceback
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
 import sys
 import os
 
-from .functions import tools
+from .functions import get_tools, REQUIRED_BY_NAME, READ_ONLY_FUNCTIONS
+from .time_estimates import estimate_writing_time
 
 # Add parent directory to path for utils import
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.time_parser import extract_time_preference
 
+logger = logging.getLogger(__name__)
+
+# Model with thinking support
+GEMINI_MODEL_NAME = 'gemini-2.5-flash'
+
+# Maximum number of live ChatSessions kept in memory (LRU)
+MAX_CHAT_SESSIONS = 1024
+
+# Maximum number of exact-match replies kept in memory (LRU)
+MAX_EXACT_CACHE_ENTRIES = 10_000
+
+# Upper bound on a shared in-flight request, so stuck entries cannot linger
+IN_FLIGHT_TIMEOUT = 120.0
+
+# Rough characters-per-token ratio, used to size history without a count_tokens round-trip
+CHARS_PER_TOKEN = 4
+
+
+# Function name -> adapter calling the matching FunctionExecutor method.
+# Each adapter takes (function_executor, user_id, args) and returns a coroutine.
+FUNCTION_HANDLERS: Dict[str, Callable[[Any, str, Dict[str, Any]], Awaitable[Dict[str, Any]]]] = {
+    "create_assignment": lambda ex, uid, a: ex.create_assignment(uid, a),
+    "create_subtasks": lambda ex, uid, a: ex.create_subtasks(
+        a["assignment_id"],
+        a["subtasks"]
+    ),
+    "schedule_tasks": lambda ex, uid, a: ex.schedule_tasks(
+        uid,
+        a["assignment_id"],
+        a.get("start_date"),
+        a.get("end_date"),
+        a.get("preferred_start_time"),
+        a.get("preferred_end_time"),
+        a.get("proposed_schedule")
+    ),
+    "update_task_status": lambda ex, uid, a: ex.update_task_status(
+        uid,
+        a["task_id"],
+        a["status"],
+        a.get("actual_duration")
+    ),
+    "get_calendar_events": lambda ex, uid, a: ex.get_calendar_events(
+        uid,
+        a["start_date"],
+        a["end_date"]
+    ),
+    "reschedule_task": lambda ex, uid, a: ex.reschedule_task(
+        uid,
+        a["task_id"],
+        a["new_start"],
+        a["new_end"]
+    ),
+    "get_user_assignments": lambda ex, uid, a: ex.get_user_assignments(
+        uid,
+        a.get("status_filter", "all")
+    ),
+
+    # ═══════════════════════════════════════════════════════════════
+    # PHASE 0: TASK VISIBILITY FUNCTIONS
+    # ═══════════════════════════════════════════════════════════════
+    "get_assignment_tasks": lambda ex, uid, a: ex.get_assignment_tasks(
+        uid,
+        a["assignment_id"]
+    ),
+    "find_tasks": lambda ex, uid, a: ex.find_tasks(
+        uid,
+        a["query"],
+        a.get("assignment_id"),
+        a.get("status")
+    ),
+
+    # ═══════════════════════════════════════════════════════════════
+    # PHASE 1: DELETE OPERATIONS
+    # ═══════════════════════════════════════════════════════════════
+    "delete_task": lambda ex, uid, a: ex.delete_task(
+        uid,
+        a["task_id"],
+        a.get("reason")
+    ),
+    "delete_assignment": lambda ex, uid, a: ex.delete_assignment(
+        uid,
+        a["assignment_id"]
+    ),
+    "delete_tasks_by_assignment": lambda ex, uid, a: ex.delete_tasks_by_assignment(
+        uid,
+        a["assignment_id"]
+    ),
+
+    # ═══════════════════════════════════════════════════════════════
+    # PHASE 2: EDIT OPERATIONS
+    # ═══════════════════════════════════════════════════════════════
+    "update_task_properties": lambda ex, uid, a: ex.update_task_properties(
+        uid,
+        a["task_id"],
+        a.get("title"),
+        a.get("description"),
+        a.get("estimated_duration"),
+        a.get("phase"),
+        a.get("intensity")
+    ),
+    "update_assignment_properties": lambda ex, uid, a: ex.update_assignment_properties(
+        uid,
+        a["assignment_id"],
+        a.get("title"),
+        a.get("description"),
+        a.get("due_date"),
+        a.get("difficulty"),
+        a.get("subject")
+    ),
+
+    # ═══════════════════════════════════════════════════════════════
+    # PHASE 3: ENHANCED QUERY OPERATIONS
+    # ═══════════════════════════════════════════════════════════════
+    "get_tasks_by_status": lambda ex, uid, a: ex.get_tasks_by_status(
+        uid,
+        a["status"],
+        a.get("limit", 50)
+    ),
+    "get_upcoming_tasks": lambda ex, uid, a: ex.get_upcoming_tasks(
+        uid,
+        a["days_ahead"]
+    ),
+    "get_all_user_tasks": lambda ex, uid, a: ex.get_all_user_tasks(
+        uid,
+        a.get("assignment_id"),
+        a.get("status_filter"),
+        a.get("cursor")
+    ),
+
+    # ═══════════════════════════════════════════════════════════════
+    # INTELLIGENT SCHEDULING FUNCTIONS
+    # ═══════════════════════════════════════════════════════════════
+    "get_scheduling_context": lambda ex, uid, a: ex.get_scheduling_context(
+        uid,
+        a["date_range_start"],
+        a["date_range_end"]
+    ),
+    "analyze_scheduling_options": lambda ex, uid, a: ex.analyze_scheduling_options(
+        uid,
+        a["assignment_id"],
+        a["date_range_start"],
+        a["date_range_end"],
+        a.get("preferred_times")
+    ),
+}
+
+
+def proto_to_dict(obj):
+    """Recursively convert proto objects to plain Python dicts"""
+    if isinstance(obj, (str, int, float, bool, type(None))):
+        return obj
+    elif isinstance(obj, dict):
+        return {k: proto_to_dict(v) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [proto_to_dict(item) for item in obj]
+    elif hasattr(obj, '__iter__') and not isinstance(obj, (str, bytes)):
+        # Handle proto repeated/map objects
+        if hasattr(obj, 'items'):
+            return {k: proto_to_dict(v) for k, v in obj.items()}
+        else:
+            return [proto_to_dict(item) for item in obj]
+    else:
+        # Try to convert to dict if it has dict-like interface
+        try:
+            return dict(obj)
+        except (TypeError, ValueError):
+            return str(obj)
+
+
+def function_args_to_dict(fn) -> Dict[str, Any]:
+    """
+    Convert a FunctionCall's args (a protobuf Struct) to a plain dict.
+
+    Uses protobuf's json_format on the raw message, which avoids walking the
+    proto-plus MapComposite value by value in Python.
+    """
+    try:
+        return MessageToDict(type(fn).pb(fn).args, preserving_proto_field_name=True)
+    except (AttributeError, TypeError):
+        # SDK versions without a proto-plus FunctionCall wrapper
+        return proto_to_dict(fn.args)
+
+
+@lru_cache(maxsize=None)
+def _configure_gemini(api_key: str):
+    """
+    Configure the Gemini SDK once per process and API key.
+
+    genai.configure discards the SDK's cached clients (and their gRPC
+    channels), so calling it again for every ChatHandler would force new
+    connections. The default transport is kept: gRPC for sync calls and
+    grpc_asyncio for the *_async calls, both HTTP/2 with one long-lived
+    channel each. Forcing a single transport string would break one of the
+    two client kinds.
+    """
+    genai.configure(api_key=api_key)
+
+
+@lru_cache(maxsize=64)
+def _get_model(system_instruction: str) -> genai.GenerativeModel:
+    """
+    Return a shared GenerativeModel for a rendered system instruction.
+
+    The tool schema and model configuration are identical for every request;
+    only the system instruction varies (date + user preferences), so models
+    are cached per distinct instruction instead of rebuilt on each message.
+    """
+    return genai.GenerativeModel(
+        model_name=GEMINI_MODEL_NAME,
+        tools=get_tools(),
+        system_instruction=system_instruction
+    )
+
+
+def _compact_prompt(text: str) -> str:
+    """
+    Collapse redundant whitespace in a prompt template.
+
+    Runs once at import. Leading indentation is kept since it conveys
+    structure in the examples; runs of inner spaces, trailing spaces and
+    blank lines are removed, and decorative ═/─ rules are shortened, so
+    fewer input tokens are sent on every call.
+    """
+    text = re.sub(r'([═─])\1{3,}', r'\1\1\1', text)
+    text = re.sub(r'(?<=\S)[ \t]{2,}', ' ', text)
+    text = re.sub(r'[ \t]+\n', '\n', text)
+    text = re.sub(r'\n\s*\n', '\n', text)
+    return text.strip()
+
 
 class ChatHandler:
     """
@@ -26,7 +265,7 @@ class ChatHandler:
     Supports function calling to interact with assignments, tasks, and calendar.
     """
 
-    SYSTEM_INSTRUCTION = """
+    SYSTEM_INSTRUCTION = _compact_prompt("""
 You are SteadyStudy, an AI study assistant that helps students manage their academic workload
 effectively. You have access to their Google Calendar and can create, schedule, and organize
 study tasks based on their unique needs and circumstances.
@@ -428,7 +667,7 @@ WHAT YOU CAN DO (With Task IDs)
 - find_tasks(query, assignment_id?, status?) - Search tasks by title
 - get_tasks_by_status(status, limit?) - All pending/completed/in_progress/skipped tasks
 - get_upcoming_tasks(days_ahead) - Tasks scheduled in next N days
-- get_all_user_tasks(assignment_id?, status_filter?) - Everything (with filters)
+- get_all_user_tasks(assignment_id?, status_filter?, cursor?) - Everything (with filters)
 
 ═══════════════════════════════════════════════════════════════════════════════
 WHAT YOU CANNOT DO (Without Task IDs First!)
@@ -599,7 +838,7 @@ TASK VISIBILITY (Use these FIRST before delete/edit):
 7. find_tasks(query, assignment_id?, status?) - Search tasks
 8. get_tasks_by_status(status, limit?) - All pending/completed/etc tasks
 9. get_upcoming_tasks(days_ahead) - Tasks in next N days
-10. get_all_user_tasks(assignment_id?, status_filter?) - Everything
+10. get_all_user_tasks(assignment_id?, status_filter?, cursor?) - Everything
 
 TASK MANIPULATION (Need task_id from visibility functions):
 11. update_task_status(task_id, status, actual_duration?) - Mark done/pending/etc
@@ -751,27 +990,63 @@ REMEMBER: You're smart because you THINK. Use thinking mode before every decisio
 Students trust you to create plans that actually work. Be worthy of that trust.
 
 Be helpful, realistic, adaptive, and focused on sustainable academic success.
-"""
+""")
 
-    def __init__(self, gemini_api_key: str):
+    def __init__(
+        self,
+        gemini_api_key: str,
+        max_history_tokens: int = 8000,
+        max_tool_iters: int = 8,
+        deadline_seconds: float = 100.0
+    ):
         """
         Initialize the chat handler with Gemini API.
 
         Args:
             gemini_api_key: Google Gemini API key
+            max_history_tokens: Approximate token budget for conversation history sent to Gemini
+            max_tool_iters: Maximum function-call round-trips per message
+            deadline_seconds: Wall-clock budget for the function-call loop of one message
         """
-        genai.configure(api_key=gemini_api_key)
+        _configure_gemini(gemini_api_key)
         self.gemini_api_key = gemini_api_key
+        self.max_history_tokens = max_history_tokens
+        self.max_tool_iters = max_tool_iters
+        self.deadline_seconds = deadline_seconds
+
+        # user_id -> (chat session, caller's history list, expected history length,
+        # estimated tokens held by the session including function calls/responses)
+        self._sessions: "OrderedDict[str, Tuple[genai.ChatSession, List[Dict[str, str]], int, int]]" = OrderedDict()
 
-    def _create_model_with_preferences(self, preferences: Optional[Dict[str, Any]] = None) -> genai.GenerativeModel:
+        # user_id -> (caller's history list, same messages in Gemini format)
+        self._history_cache: "OrderedDict[str, Tuple[List[Dict[str, str]], List[Dict[str, Any]]]]" = OrderedDict()
+
+        # Request key -> task running that request
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+        # Request key -> number of callers awaiting that request
+        self._in_flight_waiters: Dict[str, int] = {}
+
+        # Exact (rendered instruction, data version, history, message) key -> reply without function calls
+        self._exact_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+        # user_id -> counter bumped whenever a write function runs for the user
+        self._data_versions: Dict[str, int] = {}
+
+    async def close(self):
+        """Close the shared async gRPC channel to Gemini."""
+        client = genai_client.get_default_generative_async_client()
+        await client.transport.close()
+
+    def _render_system_instruction(self, preferences: Optional[Dict[str, Any]] = None) -> str:
         """
-        Create a Gemini model with user preferences injected into system prompt.
+        Render the system instruction with today's date and the user's preferences.
 
         Args:
             preferences: User preferences dict
 
         Returns:
-            Configured GenerativeModel instance
+            System instruction text for this user
         """
         # Format system instruction with current date and user preferences
         current_date = datetime.now().strftime("%B %d, %Y")
@@ -809,55 +1084,118 @@ Be helpful, realistic, adaptive, and focused on sustainable academic success.
             print(f"Missing key: {e}")
             print(f"Available keys: current_date, max_task_duration, days_available, preferred_times, productivity_pattern, max_daily_hours")
             print(f"\nSearching for all placeholders in SYSTEM_INSTRUCTION...")
-            import re
             placeholders = re.findall(r'\{([^}]+)\}', self.SYSTEM_INSTRUCTION)
             print(f"Found placeholders: {set(placeholders)}")
             print(f"{'='*60}\n")
             raise
 
-        # Initialize Gemini model with function calling and thinking enabled
-        return genai.GenerativeModel(
-            model_name='gemini-2.5-flash',  # Model with thinking support
-            tools=tools,
-            system_instruction=system_instruction
-        )
+        return system_instruction
 
     async def process_message(
         self,
         user_message: str,
         user_id: str,
         conversation_history: List[Dict[str, str]],
-        function_executor: Any
+        function_executor: Any,
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """
         Process a chat message and execute any function calls.
 
+        Identical requests from the same user that are in flight at the same
+        time (same message and recent history) share one Gemini exchange.
+        In practice this only covers separate connections, such as two open
+        tabs. A WebSocket connection handles one frame at a time, so a
+        double-click or retry on the same socket arrives after the first
+        turn is in its history and never matches. Only the caller that
+        started the exchange receives on_delta chunks.
+
         Args:
             user_message: The user's message text
             user_id: The user's ID for database operations
             conversation_history: Previous messages in the conversation
             function_executor: Object with methods for executing functions
+            on_delta: Optional callback receiving each new chunk of model text as it
+                streams in (only the new text, not the cumulative message)
 
         Returns:
             Dict with 'message' (AI response) and 'function_calls' (list of executed functions)
         """
+        # Identical requests already in flight share one Gemini exchange
+        # instead of running it twice
+        history_tail = hash(tuple(msg["content"] for msg in conversation_history[-3:]))
+        key = hashlib.blake2b(
+            f"{user_id}|{user_message}|{history_tail}".encode(),
+            digest_size=16
+        ).hexdigest()
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._process_message_with_timeout(
+                user_message, user_id, conversation_history, function_executor, on_delta
+            ))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            logger.debug("Coalescing duplicate in-flight request for user %s", user_id)
+
+        # Shield so one caller timing out does not cancel the shared exchange,
+        # but cancel it once every caller has given up (timeout, disconnect)
+        # so the Gemini stream is not left running for nobody
+        waiters = self._in_flight_waiters
+        waiters[key] = waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            waiters[key] -= 1
+            if not waiters[key]:
+                del waiters[key]
+                if not task.done():
+                    task.cancel()
+
+    async def _process_message_with_timeout(self, *args) -> Dict[str, Any]:
+        """Run _process_message under IN_FLIGHT_TIMEOUT, in the calling task."""
+        async with asyncio.timeout(IN_FLIGHT_TIMEOUT):
+            return await self._process_message(*args)
+
+    async def _process_message(
+        self,
+        user_message: str,
+        user_id: str,
+        conversation_history: List[Dict[str, str]],
+        function_executor: Any,
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """Run one chat turn against Gemini (see process_message)."""
         # Load user preferences to inject into system prompt
         preferences = await function_executor.db.get_user_preferences(user_id)
+        system_instruction = self._render_system_instruction(preferences)
 
-        # Create model with user preferences injected
-        model = self._create_model_with_preferences(preferences)
+        # Byte-identical repeat of a plain chat exchange under the same instruction
+        exact_key = self._exact_cache_key(system_instruction, user_id, user_message, conversation_history)
+        cached_response = self._exact_cache.get(exact_key)
+        if cached_response is not None:
+            self._exact_cache.move_to_end(exact_key)
+            logger.debug("Exact response cache HIT for user %s", user_id)
+            return {**cached_response, "cached": True}
 
-        # Convert conversation history to Gemini format
-        gemini_history = []
-        for msg in conversation_history:
-            gemini_history.append({
-                "role": msg["role"],
-                "parts": [msg["content"]]
-            })
+        # Routine paper/essay estimates come straight from the calibration table
+        study_settings = preferences.get("studySettings", {}) if preferences else {}
+        estimate = estimate_writing_time(
+            user_message,
+            conversation_history,
+            study_settings.get("maxTaskDuration", 120)
+        )
+        if estimate is not None:
+            print("Answered time estimate from calibration table (no Gemini call)")
+            return {"message": estimate, "function_calls": []}
+
+        # Reuse the cached Gemini model for this instruction (function calling + thinking enabled)
+        model = _get_model(system_instruction)
 
         try:
-            # Start chat session with history
-            chat = model.start_chat(history=gemini_history)
+            # Continue the user's live chat session, or start one from history
+            chat, session_tokens = self._get_chat_session(user_id, model, conversation_history)
 
             # Parse message for explicit time preferences
             time_tag = extract_time_preference(user_message)
@@ -875,7 +1213,9 @@ Be helpful, realistic, adaptive, and focused on sustainable academic success.
             print(f"Processing user message: {processed_message[:100]}...")
             print(f"{'='*60}\n")
 
-            response = chat.send_message(processed_message)
+            # Async gRPC call: the event loop keeps serving other connections
+            # during the Gemini round-trip
+            response = await self._send_message(chat, processed_message, on_delta)
 
             print(f"Gemini response received")
             print(f"Candidates: {len(response.candidates) if hasattr(response, 'candidates') else 0}")
@@ -921,136 +1261,122 @@ Be helpful, realistic, adaptive, and focused on sustainable academic success.
             created_assignments = {}  # title -> assignment_id
             created_subtasks_for = set()  # set of assignment_ids that already have subtasks
 
+            # Write functions run one at a time, in the order the model issued them
+            write_lock = asyncio.Lock()
+
+            # Bound the loop so a model that keeps calling tools cannot pin the worker
+            iterations = 0
+            deadline = time.monotonic() + self.deadline_seconds
+            truncated_reason = None
+
             # Handle function calls in a loop (AI might chain multiple calls)
             while candidate.content.parts:
-                has_function_call = False
-
-                for part in candidate.content.parts:
-                    if fn := part.function_call:
-                        has_function_call = True
-
-                        # Convert proto args to regular dict properly
-                        def proto_to_dict(obj):
-                            """Recursively convert proto objects to plain Python dicts"""
-                            if isinstance(obj, (str, int, float, bool, type(None))):
-                                return obj
-                            elif isinstance(obj, dict):
-                                return {k: proto_to_dict(v) for k, v in obj.items()}
-                            elif isinstance(obj, (list, tuple)):
-                                return [proto_to_dict(item) for item in obj]
-                            elif hasattr(obj, '__iter__') and not isinstance(obj, (str, bytes)):
-                                # Handle proto repeated/map objects
-                                if hasattr(obj, 'items'):
-                                    return {k: proto_to_dict(v) for k, v in obj.items()}
-                                else:
-                                    return [proto_to_dict(item) for item in obj]
-                            else:
-                                # Try to convert to dict if it has dict-like interface
-                                try:
-                                    return dict(obj)
-                                except (TypeError, ValueError):
-                                    return str(obj)
-
-                        args_dict = proto_to_dict(dict(fn.args))
-
-                        print(f"\nFunction call: {fn.name}")
-                        print(f"Arguments: {args_dict}")
-
-                        # Check for duplicates before executing
-                        skip_execution = False
-
-                        if fn.name == "create_assignment":
-                            title = args_dict.get("title", "")
-                            if title in created_assignments:
-                                print(f"⚠️  DUPLICATE DETECTED: Assignment '{title}' already created. Skipping.")
-                                result = {
-                                    "success": True,
-                                    "assignment_id": created_assignments[title],
-                                    "message": f"Assignment '{title}' already exists (preventing duplicate)",
-                                    "duplicate_prevented": True
-                                }
-                                skip_execution = True
-
-                        elif fn.name == "create_subtasks":
-                            assignment_id = args_dict.get("assignment_id", "")
-                            if assignment_id in created_subtasks_for:
-                                print(f"⚠️  DUPLICATE DETECTED: Subtasks for assignment {assignment_id} already created. Skipping.")
-                                result = {
-                                    "success": True,
-                                    "message": f"Subtasks for assignment {assignment_id} already exist (preventing duplicate)",
-                                    "duplicate_prevented": True
-                                }
-                                skip_execution = True
-
-                        # Execute the function if not a duplicate
-                        if not skip_execution:
-                            result = await self._execute_function(
-                                fn.name,
-                                args_dict,
-                                user_id,
-                                function_executor
-                            )
-
-                            # Track created items
-                            if fn.name == "create_assignment" and result.get("success"):
-                                title = args_dict.get("title", "")
-                                assignment_id = result.get("assignment_id")
-                                if title and assignment_id:
-                                    created_assignments[title] = assignment_id
-                                    print(f"✅ Tracked new assignment: '{title}' -> {assignment_id}")
-
-                            elif fn.name == "create_subtasks" and result.get("success"):
-                                assignment_id = args_dict.get("assignment_id")
-                                if assignment_id:
-                                    created_subtasks_for.add(assignment_id)
-                                    print(f"✅ Tracked subtasks created for assignment: {assignment_id}")
-
-                        function_results.append({
-                            "name": fn.name,
-                            "input": args_dict,
-                            "result": result
-                        })
-
-                        # Send function response back to model
-                        response = chat.send_message(
+                function_calls = [part.function_call for part in candidate.content.parts if part.function_call]
+                if not function_calls:
+                    break
+
+                if iterations >= self.max_tool_iters:
+                    truncated_reason = "max_tool_iterations_exceeded"
+                elif time.monotonic() >= deadline:
+                    truncated_reason = "tool_deadline_exceeded"
+                if truncated_reason:
+                    print(f"⚠️  Stopping function-call loop after {iterations} round(s): {truncated_reason}")
+                    break
+                iterations += 1
+
+                # Independent calls from the same response run concurrently
+                # Convert each call's args once
+                calls = [(fn.name, function_args_to_dict(fn)) for fn in function_calls]
+                results = await asyncio.gather(*[
+                    self._run_function_call(
+                        name,
+                        args_dict,
+                        user_id,
+                        function_executor,
+                        created_assignments,
+                        created_subtasks_for,
+                        write_lock
+                    )
+                    for name, args_dict in calls
+                ])
+
+                for (name, args_dict), result in zip(calls, results):
+                    function_results.append({
+                        "name": name,
+                        "input": args_dict,
+                        "result": result
+                    })
+                    # Calls and responses stay in the session's context
+                    session_tokens += self._estimate_payload_tokens(args_dict)
+                    session_tokens += self._estimate_payload_tokens(result)
+
+                # Send all function responses back to model in one message
+                response = await self._send_message(
+                    chat,
+                    {
+                        "role": "function",
+                        "parts": [
                             {
-                                "role": "function",
-                                "parts": [{
-                                    "function_response": {
-                                        "name": fn.name,
-                                        "response": result
-                                    }
-                                }]
+                                "function_response": {
+                                    "name": name,
+                                    "response": result
+                                }
                             }
-                        )
-                        # Update candidate for next iteration
-                        if hasattr(response, 'candidates') and len(response.candidates) > 0:
-                            candidate = response.candidates[0]
+                            for (name, _), result in zip(calls, results)
+                        ]
+                    },
+                    on_delta
+                )
 
-                if not has_function_call:
+                # Update candidate for next iteration
+                if not hasattr(response, 'candidates') or len(response.candidates) == 0:
                     break
+                candidate = response.candidates[0]
 
             # Extract final text response (filter out thinking blocks if present)
-            final_message = ""
-            for part in candidate.content.parts:
-                if hasattr(part, 'text') and part.text:
-                    final_message += part.text
+            final_message = "".join(
+                part.text for part in candidate.content.parts
+                if hasattr(part, 'text') and part.text
+            )
 
             # If no text message, provide a default
-            if not final_message and function_results:
+            if truncated_reason:
+                final_message = final_message or (
+                    "I had to stop before finishing this request. "
+                    "Let me know if you'd like me to continue with the remaining steps."
+                )
+            elif not final_message and function_results:
                 final_message = "I've completed the requested actions."
             elif not final_message:
                 final_message = "I understand. How can I help you with your assignments?"
 
-            return {
+            reply = {
                 "message": final_message,
                 "function_calls": function_results
             }
 
+            if truncated_reason:
+                # The session ends on unanswered function calls; don't store it
+                reply["truncated"] = True
+                reply["error"] = truncated_reason
+                return reply
+
+            # Only replies that ran no tools are safe to serve verbatim
+            if not function_results:
+                self._exact_cache[exact_key] = reply
+                while len(self._exact_cache) > MAX_EXACT_CACHE_ENTRIES:
+                    self._exact_cache.popitem(last=False)
+            session_tokens += self._estimate_text_tokens(processed_message)
+            session_tokens += self._estimate_text_tokens(final_message)
+            self._remember_chat_session(user_id, chat, conversation_history, session_tokens)
+
+            return reply
+
         except Exception as e:
-            print(f"ERROR in process_message: {type(e).__name__}: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(
+                "process_message failed",
+                extra={"user_id": user_id, "error_type": type(e).__name__}
+            )
 
             # Check if it's a malformed function call error
             error_str = str(e)
@@ -1067,197 +1393,337 @@ Be helpful, realistic, adaptive, and focused on sustainable academic success.
                     "error": str(e)
                 }
 
-    async def _execute_function(
+    async def _send_message(
         self,
-        name: str,
-        args: Dict[str, Any],
+        chat: genai.ChatSession,
+        content: Any,
+        on_delta: Optional[Callable[[str], Awaitable[None]]]
+    ):
+        """
+        Send content through the chat session, streaming text when requested.
+
+        With on_delta set, the response is streamed and only the text of each
+        new chunk is forwarded; the fully aggregated response is returned
+        either way.
+
+        Args:
+            chat: Chat session to send through
+            content: User message text or function-response message
+            on_delta: Optional callback for new text chunks
+
+        Returns:
+            Gemini response with aggregated candidates
+        """
+        if on_delta is None:
+            return await chat.send_message_async(content)
+
+        response = await chat.send_message_async(content, stream=True)
+        async for chunk in response:
+            if not chunk.candidates:
+                continue
+            delta = "".join(
+                part.text for part in chunk.candidates[0].content.parts
+                if hasattr(part, 'text') and part.text
+            )
+            if delta:
+                await on_delta(delta)
+
+        return response
+
+    def _exact_cache_key(
+        self,
+        system_instruction: str,
         user_id: str,
-        function_executor: Any
-    ) -> Dict[str, Any]:
+        user_message: str,
+        conversation_history: List[Dict[str, str]]
+    ) -> str:
         """
-        Execute a function call and return results.
+        Build the exact-match cache key for a chat turn.
+
+        The key covers the rendered system instruction (today's date and the
+        user's current preferences), the user's data version (so any write
+        invalidates it), the full history and the message.
+        """
+        digest = hashlib.blake2b(system_instruction.encode(), digest_size=16)
+        digest.update(f"\x00{user_id}|{self._data_versions.get(user_id, 0)}".encode())
+        for msg in conversation_history:
+            digest.update(f"\x00{msg['role']}\x01{msg['content']}".encode())
+        digest.update(f"\x00user\x01{user_message}".encode())
+        return digest.hexdigest()
+
+    def _invalidate_user_caches(self, user_id: str):
+        """Drop cached replies for a user after their data changed."""
+        self._data_versions[user_id] = self._data_versions.get(user_id, 0) + 1
+
+    def _get_chat_session(
+        self,
+        user_id: str,
+        model: genai.GenerativeModel,
+        conversation_history: List[Dict[str, str]]
+    ) -> Tuple[genai.ChatSession, int]:
+        """
+        Get the user's ChatSession, reusing it when it already holds this conversation.
+
+        A stored session is reused only if it was created with the same model
+        (same rendered system instruction), the caller's history list has
+        advanced by exactly the user/model pair appended after the last turn,
+        and everything the session holds (text plus function calls and
+        responses) still fits the history token budget. Otherwise the history
+        is trimmed to the budget, converted and a new session is started.
+
+        The stored session is removed while the turn runs and only stored
+        again by _remember_chat_session once the turn completes, so a turn
+        that fails, times out or is cancelled never leaves a half-finished
+        session behind.
 
         Args:
-            name: Function name
-            args: Function arguments
-            user_id: User ID for database operations
-            function_executor: Object with methods for executing functions
+            user_id: The user's ID
+            model: Model configured for this turn
+            conversation_history: Previous messages in the conversation
 
         Returns:
-            Function execution result
+            Tuple of (ChatSession to send this turn through, estimated tokens it holds)
         """
-        try:
-            if name == "create_assignment":
-                return await function_executor.create_assignment(user_id, args)
+        entry = self._sessions.pop(user_id, None)
+        if entry:
+            chat, history_ref, expected_length, session_tokens = entry
+            if (
+                chat.model is model
+                and history_ref is conversation_history
+                and len(conversation_history) == expected_length
+                and session_tokens <= self.max_history_tokens
+            ):
+                return chat, session_tokens
+
+        # Send only the newest messages that fit the budget
+        converted = self._convert_history(user_id, conversation_history)
+        trimmed = self._trim_history(conversation_history)
+        start = len(conversation_history) - len(trimmed)
+        return model.start_chat(history=converted[start:]), self._estimate_tokens(trimmed)
+
+    def _convert_history(
+        self,
+        user_id: str,
+        conversation_history: List[Dict[str, str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Get conversation history in Gemini format, converting only new messages.
 
-            elif name == "create_subtasks":
-                return await function_executor.create_subtasks(
-                    args["assignment_id"],
-                    args["subtasks"]
-                )
+        The converted list is cached per user and extended with the messages
+        appended to the caller's history list since the previous call. A
+        different list, or one that shrank, is converted from scratch.
 
-            elif name == "schedule_tasks":
-                return await function_executor.schedule_tasks(
-                    user_id,
-                    args["assignment_id"],
-                    args.get("start_date"),
-                    args.get("end_date"),
-                    args.get("preferred_start_time"),
-                    args.get("preferred_end_time"),
-                    args.get("proposed_schedule")
-                )
+        Args:
+            user_id: The user's ID
+            conversation_history: Previous messages in the conversation
 
-            elif name == "update_task_status":
-                return await function_executor.update_task_status(
-                    user_id,
-                    args["task_id"],
-                    args["status"],
-                    args.get("actual_duration")
-                )
+        Returns:
+            List of {"role", "parts"} dicts aligned with conversation_history
+        """
+        entry = self._history_cache.get(user_id)
+        if entry and entry[0] is conversation_history and len(entry[1]) <= len(conversation_history):
+            converted = entry[1]
+            self._history_cache.move_to_end(user_id)
+        else:
+            converted = []
+            self._history_cache[user_id] = (conversation_history, converted)
 
-            elif name == "get_calendar_events":
-                return await function_executor.get_calendar_events(
-                    user_id,
-                    args["start_date"],
-                    args["end_date"]
-                )
+        converted.extend(
+            {"role": msg["role"], "parts": [msg["content"]]}
+            for msg in conversation_history[len(converted):]
+        )
 
-            elif name == "reschedule_task":
-                return await function_executor.reschedule_task(
-                    user_id,
-                    args["task_id"],
-                    args["new_start"],
-                    args["new_end"]
-                )
+        while len(self._history_cache) > MAX_CHAT_SESSIONS:
+            self._history_cache.popitem(last=False)
 
-            elif name == "get_user_assignments":
-                return await function_executor.get_user_assignments(
-                    user_id,
-                    args.get("status_filter", "all")
-                )
+        return converted
 
-            # ═══════════════════════════════════════════════════════════════
-            # PHASE 0: TASK VISIBILITY FUNCTIONS
-            # ═══════════════════════════════════════════════════════════════
-            elif name == "get_assignment_tasks":
-                return await function_executor.get_assignment_tasks(
-                    user_id,
-                    args["assignment_id"]
-                )
+    @staticmethod
+    def _estimate_text_tokens(text: str) -> int:
+        """Approximate the token count of one message's text."""
+        return len(text) // CHARS_PER_TOKEN + 1
 
-            elif name == "find_tasks":
-                return await function_executor.find_tasks(
-                    user_id,
-                    args["query"],
-                    args.get("assignment_id"),
-                    args.get("status")
-                )
+    @staticmethod
+    def _estimate_tokens(history: List[Dict[str, str]]) -> int:
+        """Approximate the token count of a list of history messages."""
+        return sum(len(msg["content"]) // CHARS_PER_TOKEN + 1 for msg in history)
 
-            # ═══════════════════════════════════════════════════════════════
-            # PHASE 1: DELETE OPERATIONS
-            # ═══════════════════════════════════════════════════════════════
-            elif name == "delete_task":
-                return await function_executor.delete_task(
-                    user_id,
-                    args["task_id"],
-                    args.get("reason")
-                )
+    @staticmethod
+    def _estimate_payload_tokens(payload: Dict[str, Any]) -> int:
+        """Approximate the token count of function call arguments or a function response."""
+        return len(str(payload)) // CHARS_PER_TOKEN + 1
 
-            elif name == "delete_assignment":
-                return await function_executor.delete_assignment(
-                    user_id,
-                    args["assignment_id"]
-                )
+    def _trim_history(self, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Keep the newest messages that fit in the history token budget.
 
-            elif name == "delete_tasks_by_assignment":
-                return await function_executor.delete_tasks_by_assignment(
-                    user_id,
-                    args["assignment_id"]
-                )
+        Args:
+            history: Messages in chronological order
 
-            # ═══════════════════════════════════════════════════════════════
-            # PHASE 2: EDIT OPERATIONS
-            # ═══════════════════════════════════════════════════════════════
-            elif name == "update_task_properties":
-                return await function_executor.update_task_properties(
-                    user_id,
-                    args["task_id"],
-                    args.get("title"),
-                    args.get("description"),
-                    args.get("estimated_duration"),
-                    args.get("phase"),
-                    args.get("intensity")
-                )
+        Returns:
+            Chronological suffix of history within max_history_tokens
+        """
+        budget = self.max_history_tokens
+        start = len(history)
 
-            elif name == "update_assignment_properties":
-                return await function_executor.update_assignment_properties(
-                    user_id,
-                    args["assignment_id"],
-                    args.get("title"),
-                    args.get("description"),
-                    args.get("due_date"),
-                    args.get("difficulty"),
-                    args.get("subject")
-                )
+        # Walk newest to oldest until the budget is exhausted
+        for index in range(len(history) - 1, -1, -1):
+            budget -= len(history[index]["content"]) // CHARS_PER_TOKEN + 1
+            if budget < 0:
+                break
+            start = index
 
-            # ═══════════════════════════════════════════════════════════════
-            # PHASE 3: ENHANCED QUERY OPERATIONS
-            # ═══════════════════════════════════════════════════════════════
-            elif name == "get_tasks_by_status":
-                return await function_executor.get_tasks_by_status(
-                    user_id,
-                    args["status"],
-                    args.get("limit", 50)
-                )
+        # Gemini expects the history to open with a user turn
+        while start < len(history) and history[start]["role"] != "user":
+            start += 1
 
-            elif name == "get_upcoming_tasks":
-                return await function_executor.get_upcoming_tasks(
-                    user_id,
-                    args["days_ahead"]
-                )
+        if start:
+            print(f"Trimmed {start} older message(s) from chat history to fit {self.max_history_tokens} token budget")
 
-            elif name == "get_all_user_tasks":
-                return await function_executor.get_all_user_tasks(
-                    user_id,
-                    args.get("assignment_id"),
-                    args.get("status_filter")
-                )
+        return history[start:]
 
-            # ═══════════════════════════════════════════════════════════════
-            # INTELLIGENT SCHEDULING FUNCTIONS
-            # ═══════════════════════════════════════════════════════════════
-            elif name == "get_scheduling_context":
-                return await function_executor.get_scheduling_context(
-                    user_id,
-                    args["date_range_start"],
-                    args["date_range_end"]
-                )
+    def _remember_chat_session(
+        self,
+        user_id: str,
+        chat: genai.ChatSession,
+        conversation_history: List[Dict[str, str]],
+        session_tokens: int
+    ):
+        """
+        Store a session after a completed turn so the next turn can continue it.
 
-            elif name == "analyze_scheduling_options":
-                return await function_executor.analyze_scheduling_options(
-                    user_id,
-                    args["assignment_id"],
-                    args["date_range_start"],
-                    args["date_range_end"],
-                    args.get("preferred_times")
-                )
+        Args:
+            user_id: The user's ID
+            chat: Session that processed the turn
+            conversation_history: History list the caller will append this turn to
+            session_tokens: Estimated tokens the session now holds
+        """
+        # The caller appends the user message and the model reply after each turn
+        self._sessions[user_id] = (chat, conversation_history, len(conversation_history) + 2, session_tokens)
+        self._sessions.move_to_end(user_id)
 
-            else:
+        while len(self._sessions) > MAX_CHAT_SESSIONS:
+            self._sessions.popitem(last=False)
+
+    async def _run_function_call(
+        self,
+        name: str,
+        args_dict: Dict[str, Any],
+        user_id: str,
+        function_executor: Any,
+        created_assignments: Dict[str, str],
+        created_subtasks_for: set,
+        write_lock: asyncio.Lock
+    ) -> Dict[str, Any]:
+        """
+        Execute one function call from the model, guarding against duplicates.
+
+        Read-only functions run immediately so that calls from the same model
+        response overlap. Write functions are serialized through write_lock,
+        which keeps duplicate tracking and ordering identical to running the
+        calls one by one.
+
+        Args:
+            name: Function name
+            args_dict: Function arguments
+            user_id: User ID for database operations
+            function_executor: Object with methods for executing functions
+            created_assignments: Assignment titles created this turn -> assignment_id
+            created_subtasks_for: Assignment IDs that already got subtasks this turn
+            write_lock: Lock shared by all calls in this turn
+
+        Returns:
+            Function execution result
+        """
+        print(f"\nFunction call: {name}")
+        print(f"Arguments: {args_dict}")
+
+        if name in READ_ONLY_FUNCTIONS:
+            return await self._execute_function(name, args_dict, user_id, function_executor)
+
+        async with write_lock:
+            # Check for duplicates before executing
+            if name == "create_assignment":
+                title = args_dict.get("title", "")
+                if title in created_assignments:
+                    print(f"⚠️  DUPLICATE DETECTED: Assignment '{title}' already created. Skipping.")
+                    return {
+                        "success": True,
+                        "assignment_id": created_assignments[title],
+                        "message": f"Assignment '{title}' already exists (preventing duplicate)",
+                        "duplicate_prevented": True
+                    }
+
+            elif name == "create_subtasks":
+                assignment_id = args_dict.get("assignment_id", "")
+                if assignment_id in created_subtasks_for:
+                    print(f"⚠️  DUPLICATE DETECTED: Subtasks for assignment {assignment_id} already created. Skipping.")
+                    return {
+                        "success": True,
+                        "message": f"Subtasks for assignment {assignment_id} already exist (preventing duplicate)",
+                        "duplicate_prevented": True
+                    }
+
+            result = await self._execute_function(name, args_dict, user_id, function_executor)
+
+            # Any write makes cached replies for this user stale
+            self._invalidate_user_caches(user_id)
+
+            # Track created items
+            if name == "create_assignment" and result.get("success"):
+                title = args_dict.get("title", "")
+                assignment_id = result.get("assignment_id")
+                if title and assignment_id:
+                    created_assignments[title] = assignment_id
+                    print(f"✅ Tracked new assignment: '{title}' -> {assignment_id}")
+
+            elif name == "create_subtasks" and result.get("success"):
+                assignment_id = args_dict.get("assignment_id")
+                if assignment_id:
+                    created_subtasks_for.add(assignment_id)
+                    print(f"✅ Tracked subtasks created for assignment: {assignment_id}")
+
+            return result
+
+    async def _execute_function(
+        self,
+        name: str,
+        args: Dict[str, Any],
+        user_id: str,
+        function_executor: Any
+    ) -> Dict[str, Any]:
+        """
+        Execute a function call and return results.
+
+        Args:
+            name: Function name
+            args: Function arguments
+            user_id: User ID for database operations
+            function_executor: Object with methods for executing functions
+
+        Returns:
+            Function execution result
+        """
+        try:
+            handler = FUNCTION_HANDLERS.get(name)
+            if handler is None:
                 return {"error": f"Unknown function: {name}"}
 
+            missing = REQUIRED_BY_NAME[name].difference(args)
+            if missing:
+                return {"error": f"Missing required arguments for {name}: {', '.join(sorted(missing))}"}
+
+            return await handler(function_executor, user_id, args)
+
         except Exception as e:
-            import traceback
             error_traceback = traceback.format_exc()
 
-            print(f"\n{'='*60}")
-            print(f"❌ ERROR: Function execution failed")
-            print(f"Function: {name}")
-            print(f"Args: {args}")
-            print(f"Exception Type: {type(e).__name__}")
-            print(f"Exception Message: {str(e)}")
-            print(f"\nFull Traceback:")
-            print(error_traceback)
-            print(f"{'='*60}\n")
+            # Arguments are passed as log record fields and only rendered if emitted
+            logger.exception(
+                "Function execution failed: %s",
+                name,
+                extra={"function": name, "function_args": args, "error_type": type(e).__name__}
+            )
 
             return {
                 "error": f"Function execution failed: {type(e).__name__}: {str(e)}",
@@ -0,0 +1,163 @@
+"""
+Deterministic Time Estimates for SteadyStudy
+
+Answers routine "how long will an N-page paper take?" questions directly
+from the calibration table in the system instruction, without a Gemini
+round-trip.
+
+Short-circuited requests (everything else goes to Gemini):
+- The whole message is one time-estimate question ("estimate", "how long",
+  "how much time")
+- about a single page count ("5 page", "10-page")
+- for a paper or essay
+- with no request to create, schedule, plan or change anything
+- and no assignment, paper or essay discussed in the last few messages
+  (the question may refer to it, so the model should answer in context)
+
+Work blocks are split to respect the user's max task duration.
+"""
+
+import math
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Writing calibration from ChatHandler.SYSTEM_INSTRUCTION:
+# (max pages, (min minutes, max minutes), [(work block, minutes), ...])
+WRITING_TIME_TABLE: Tuple[Tuple[float, Tuple[int, int], Tuple[Tuple[str, int], ...]], ...] = (
+    (2, (45, 60), (
+        ("Write & revise response", 60),
+    )),
+    (5, (120, 180), (
+        ("Research & outline", 60),
+        ("Write draft", 90),
+        ("Revise", 45),
+    )),
+    (10, (300, 420), (
+        ("Research phase", 120),
+        ("Draft body", 120),
+        ("Intro/conclusion & polish", 90),
+    )),
+    (float("inf"), (600, 900), (
+        ("Research & outline", 180),
+        ("Draft pt 1", 120),
+        ("Draft pt 2", 120),
+        ("Revise & polish", 120),
+    )),
+)
+
+# Messages that ask for a change must always reach the model
+MUTATION_INTENT = re.compile(
+    r"\b(create|add|schedule|reschedule|move|delete|remove|clear|cancel|update|"
+    r"change|rename|edit|mark|finish(ed)?|done|complete(d)?|redo|skip)\b",
+    re.IGNORECASE
+)
+
+# Other requests that can ride along with an estimate question
+OTHER_INTENT = re.compile(
+    r"\b(plan|planning|due|deadline|calendar|remind|help me|then|also|"
+    r"today|tonight|tomorrow|week|weekend|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b",
+    re.IGNORECASE
+)
+
+# The whole message must be a single estimate question (one sentence)
+ESTIMATE_REQUEST = re.compile(
+    r"\s*[^.?!\n]*?\b(?:estimate|how long|how much time)\b[^.?!\n]*?"
+    r"\b(\d{1,3})[\s-]*pages?\b[^.?!\n]*?\b(paper|essay)s?\b[^.?!\n]*[.?!]*\s*",
+    re.IGNORECASE
+)
+
+# Earlier messages about a specific piece of work the question may refer to
+ASSIGNMENT_CONTEXT = re.compile(r"\b(assignment|paper|essay)s?\b", re.IGNORECASE)
+
+# Number of previous messages checked for ASSIGNMENT_CONTEXT
+CONTEXT_WINDOW = 4
+
+# Shortest work block, matching FunctionExecutor.create_subtasks
+MIN_TASK_DURATION = 15
+
+
+def _format_minutes(minutes: int) -> str:
+    """Render minutes as '45 min', '2 hours' or '2.5 hours'."""
+    if minutes < 60:
+        return f"{minutes} min"
+    hours = minutes / 60
+    return f"{hours:g} hour" if hours == 1 else f"{hours:g} hours"
+
+
+def _format_range(low: int, high: int) -> str:
+    """Render a minute range as '45-60 min' or '2-3 hours'."""
+    if low < 60:
+        return f"{low}-{high} min"
+    return f"{low / 60:g}-{high / 60:g} hours"
+
+
+def _split_blocks(
+    blocks: Sequence[Tuple[str, int]],
+    max_task_duration: int
+) -> List[Tuple[str, int]]:
+    """Split work blocks longer than max_task_duration into equal parts."""
+    limit = max(max_task_duration, MIN_TASK_DURATION)
+    split: List[Tuple[str, int]] = []
+    for title, minutes in blocks:
+        parts = math.ceil(minutes / limit)
+        if parts == 1:
+            split.append((title, minutes))
+            continue
+        part_minutes = max(MIN_TASK_DURATION, math.ceil(minutes / parts))
+        split.extend(
+            (f"{title} (part {index} of {parts})", part_minutes)
+            for index in range(1, parts + 1)
+        )
+    return split
+
+
+def estimate_writing_time(
+    message: str,
+    conversation_history: Sequence[Dict[str, str]] = (),
+    max_task_duration: int = 120
+) -> Optional[str]:
+    """
+    Answer a simple paper/essay time-estimate question from the calibration table.
+
+    Args:
+        message: The user's message text
+        conversation_history: Previous messages in the conversation
+        max_task_duration: User's maximum task length in minutes
+
+    Returns:
+        Reply text, or None if the message should go to Gemini
+    """
+    match = ESTIMATE_REQUEST.fullmatch(message)
+    if not match or MUTATION_INTENT.search(message) or OTHER_INTENT.search(message):
+        return None
+
+    if any(
+        ASSIGNMENT_CONTEXT.search(msg.get("content", ""))
+        for msg in conversation_history[-CONTEXT_WINDOW:]
+    ):
+        return None
+
+    pages = int(match.group(1))
+    kind = match.group(2).lower()
+    if pages == 0:
+        return None
+
+    for max_pages, (low, high), blocks in WRITING_TIME_TABLE:
+        if pages <= max_pages:
+            break
+
+    lines: List[str] = [
+        f"A {pages}-page {kind} typically takes about {_format_range(low, high)} in total "
+        f"for a student comfortable with the material. A good way to split it:",
+        "",
+    ]
+    lines.extend(
+        f"- {title} ({_format_minutes(minutes)})"
+        for title, minutes in _split_blocks(blocks, max_task_duration)
+    )
+    lines.extend([
+        "",
+        "Add time if the topic is new to you or the material is difficult. "
+        "If you'd like, tell me the due date and I can create the assignment and schedule these sessions.",
+    ])
+    return "\n".join(lines)
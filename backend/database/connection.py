@@ -6,67 +6,207 @@ database operations.
 """
 
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import asyncio
 import os
-from datetime import datetime
+import re
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument, WriteConcern
+
+
+# BSON value type -> JSON-serializable converter
+_CONVERTERS = {
+    ObjectId: str,
+    datetime: datetime.isoformat,
+}
 
 
 def serialize_document(doc: Dict[str, Any]) -> Dict[str, Any]:
     """
     Convert MongoDB document to JSON-serializable format.
     Converts ObjectId to string and datetime to ISO format.
+
+    Walks nested documents (and documents inside lists) iteratively,
+    converting values in place.
     """
     if not doc:
         return doc
 
-    for key, value in doc.items():
-        if isinstance(value, ObjectId):
-            doc[key] = str(value)
-        elif isinstance(value, datetime):
-            doc[key] = value.isoformat()
-        elif isinstance(value, dict):
-            doc[key] = serialize_document(value)
-        elif isinstance(value, list):
-            doc[key] = [serialize_document(item) if isinstance(item, dict) else item for item in value]
+    stack = [doc]
+    while stack:
+        current = stack.pop()
+        for key, value in current.items():
+            converter = _CONVERTERS.get(type(value))
+            if converter is not None:
+                current[key] = converter(value)
+            elif isinstance(value, dict):
+                stack.append(value)
+            elif isinstance(value, list):
+                stack.extend(item for item in value if isinstance(item, dict))
 
     return doc
 
 
+def _utcnow() -> datetime:
+    """Current UTC time as a naive datetime, matching the stored timestamps."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+@lru_cache(maxsize=4096)
+def _object_id(value: str) -> ObjectId:
+    """Parse an ID string into an ObjectId, memoized across requests."""
+    return ObjectId(value)
+
+
+def _encode_task_cursor(task: Dict[str, Any]) -> str:
+    """Build a task page cursor from a serialized task's created_at and _id."""
+    return f"{task['created_at']}_{task['_id']}"
+
+
+def _decode_task_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """
+    Parse a task page cursor back into its (created_at, _id) position.
+
+    Raises:
+        ValueError: If the cursor was not produced by _encode_task_cursor
+    """
+    created_at, _, last_id = cursor.rpartition("_")
+    try:
+        return datetime.fromisoformat(created_at), _object_id(last_id)
+    except (ValueError, TypeError, InvalidId):
+        raise ValueError(f"Invalid task cursor: {cursor!r}") from None
+
+
 class Database:
     """
     MongoDB database connection and operations handler.
     """
 
+    # Projections for queries that only read a few fields
+    _CHAT_HISTORY_PROJECTION = {"_id": 0, "role": 1, "content": 1, "attachments": 1}
+    _OWNER_PROJECTION = {"user_id": 1}
+
+    # Preferences are edited from the web app directly in MongoDB, so cached
+    # copies are only trusted briefly
+    PREFERENCES_CACHE_TTL = 60
+
+    # Health checks ping MongoDB at most once per PING_CACHE_TTL seconds
+    PING_CACHE_TTL = 5
+    PING_TIMEOUT = 2.0
+
     def __init__(self):
         self.client: Optional[AsyncIOMotorClient] = None
         self.db = None
+        self._chat_messages = None
+        # user_id -> (cached_at, preferences document or None)
+        self._preferences_cache: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
+        # (checked_at, reachable) from the last ping
+        self._ping_cache: Tuple[float, bool] = (float("-inf"), False)
 
     async def connect(self):
-        """Connect to MongoDB Atlas"""
+        """Connect to MongoDB Atlas (no-op if already connected)"""
+        if self.client is not None:
+            return
+
         mongodb_uri = os.getenv("MONGODB_URI")
 
         if not mongodb_uri:
             raise ValueError("MONGODB_URI environment variable is not set")
 
-        self.client = AsyncIOMotorClient(mongodb_uri)
+        self.client = AsyncIOMotorClient(
+            mongodb_uri,
+            maxPoolSize=int(os.getenv("MONGODB_MAX_POOL_SIZE", "200")),
+            minPoolSize=int(os.getenv("MONGODB_MIN_POOL_SIZE", "10")),
+            maxIdleTimeMS=300_000,
+            serverSelectionTimeoutMS=5000,
+            connectTimeoutMS=5000,
+            # zlib ships with Python; zstd/snappy would need extra packages
+            compressors="zlib",
+            retryWrites=True
+        )
         # Use hyphen to match frontend database name
         self.db = self.client["study-autopilot"]
 
+        # Chat messages only need primary acknowledgement; other collections
+        # keep the cluster default (majority on Atlas)
+        self._chat_messages = self.db.get_collection(
+            "chat_messages",
+            write_concern=WriteConcern(w=1)
+        )
+
         # Test the connection
         await self.client.admin.command('ping')
         print("Successfully connected to MongoDB!")
 
+        await self._ensure_indexes()
+
+    async def _ensure_indexes(self):
+        """
+        Create the compound indexes backing the hottest query shapes.
+
+        create_index is a no-op for indexes that already exist, so this is
+        safe to run on every startup. Failures are logged, not raised, so a
+        user without index privileges can still start the app.
+        """
+        try:
+            await asyncio.gather(
+                # get_tasks_by_status / get_all_user_tasks / find_tasks
+                self.db.subtasks.create_index([("user_id", 1), ("status", 1), ("created_at", -1)]),
+                # get_upcoming_tasks and scheduling conflict checks
+                self.db.subtasks.create_index([("user_id", 1), ("scheduled_start", 1)]),
+                # get_assignment_tasks and cascade deletes
+                self.db.subtasks.create_index([("assignment_id", 1), ("order_index", 1)]),
+                # get_chat_history
+                self.db.chat_messages.create_index([("user_id", 1), ("timestamp", -1)]),
+                # get_user_assignments
+                self.db.assignments.create_index([("user_id", 1), ("status", 1)]),
+                # get_user_preferences
+                self.db.user_preferences.create_index("userId")
+            )
+        except Exception as e:
+            print(f"Warning: could not create MongoDB indexes: {e}")
+
     async def close(self):
         """Close database connection"""
         if self.client:
             self.client.close()
+            self.client = None
+            self.db = None
+            self._chat_messages = None
             print("MongoDB connection closed")
 
     def is_connected(self) -> bool:
         """Check if database is connected"""
         return self.client is not None and self.db is not None
 
+    async def ping(self) -> bool:
+        """
+        Check that MongoDB answers a ping, reusing the result for PING_CACHE_TTL seconds.
+
+        Returns:
+            True if the server responded within PING_TIMEOUT
+        """
+        if not self.is_connected():
+            return False
+
+        checked_at, reachable = self._ping_cache
+        if time.monotonic() - checked_at < self.PING_CACHE_TTL:
+            return reachable
+
+        try:
+            await asyncio.wait_for(self.client.admin.command('ping'), timeout=self.PING_TIMEOUT)
+            reachable = True
+        except Exception as e:
+            print(f"MongoDB ping failed: {e}")
+            reachable = False
+
+        self._ping_cache = (time.monotonic(), reachable)
+        return reachable
+
     # ==================== CHAT HISTORY ====================
 
     async def get_chat_history(
@@ -84,12 +224,14 @@ class Database:
         Returns:
             List of messages in format [{"role": "user", "content": "..."}, ...]
         """
-        messages = await self.db.chat_messages.find(
-            {"user_id": user_id}
-        ).sort("timestamp", -1).limit(limit).to_list(length=limit)
-
-        # Reverse to get chronological order
-        messages.reverse()
+        # Take the newest messages, then re-sort them chronologically on the server
+        messages = await self.db.chat_messages.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$sort": {"timestamp": -1}},
+            {"$limit": limit},
+            {"$sort": {"timestamp": 1}},
+            {"$project": self._CHAT_HISTORY_PROJECTION}
+        ]).to_list(length=limit)
 
         # Convert to Gemini format
         return [
@@ -103,49 +245,44 @@ class Database:
     def _build_content_with_attachments(self, msg: Dict[str, Any]) -> str:
         """Append attachment context to message content for AI history."""
         content = msg.get("content", "")
-        attachments = msg.get("attachments") or []
+        attachments = msg.get("attachments")
         if not attachments:
             return content
 
-        attachment_descriptions = []
+        parts = [content] if content else []
         for attachment in attachments:
-            filename = attachment.get("filename", "attachment")
             attachment_text = attachment.get("extracted_text") or attachment.get("preview")
             if attachment_text:
-                attachment_descriptions.append(
-                    f"[Attachment: {filename}]\n{attachment_text}"
-                )
+                parts.append(f"[Attachment: {attachment.get('filename', 'attachment')}]\n{attachment_text}")
 
-        if attachment_descriptions:
-            if content:
-                content = f"{content}\n\n" + "\n\n".join(attachment_descriptions)
-            else:
-                content = "\n\n".join(attachment_descriptions)
+        return "\n\n".join(parts)
 
-        return content
-
-    async def save_message(
+    def build_message(
         self,
         user_id: str,
         role: str,
         content: str,
         function_calls: Optional[List[Dict]] = None,
         attachments: Optional[List[Dict[str, Any]]] = None
-    ):
+    ) -> Dict[str, Any]:
         """
-        Save a chat message to the database.
+        Build a chat message document, timestamped now.
 
         Args:
             user_id: User's ID
             role: "user" or "model"
             content: Message content
             function_calls: Optional list of function calls made
+            attachments: Optional list of attachments
+
+        Returns:
+            Message document for save_messages
         """
         message = {
             "user_id": user_id,
             "role": role,
             "content": content,
-            "timestamp": datetime.utcnow(),
+            "timestamp": _utcnow(),
         }
 
         if function_calls:
@@ -154,21 +291,53 @@ class Database:
         if attachments:
             message["attachments"] = attachments
 
-        await self.db.chat_messages.insert_one(message)
+        return message
+
+    async def save_message(
+        self,
+        user_id: str,
+        role: str,
+        content: str,
+        function_calls: Optional[List[Dict]] = None,
+        attachments: Optional[List[Dict[str, Any]]] = None
+    ):
+        """
+        Save a chat message to the database.
+
+        Args:
+            user_id: User's ID
+            role: "user" or "model"
+            content: Message content
+            function_calls: Optional list of function calls made
+        """
+        await self._chat_messages.insert_one(
+            self.build_message(user_id, role, content, function_calls, attachments)
+        )
+
+    async def save_messages(self, messages: List[Dict[str, Any]]):
+        """
+        Save several chat messages in one round-trip.
+
+        Args:
+            messages: Documents from build_message (ordered by their timestamps)
+        """
+        if messages:
+            await self._chat_messages.insert_many(messages, ordered=False)
 
     # ==================== USER OPERATIONS ====================
 
     async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
-        user = await self.db.users.find_one({"_id": ObjectId(user_id)})
+        user = await self.db.users.find_one({"_id": _object_id(user_id)})
         if user:
             serialize_document(user)
         return user
 
     async def create_user(self, user_data: Dict[str, Any]) -> str:
         """Create a new user"""
-        user_data["created_at"] = datetime.utcnow()
-        user_data["last_login"] = datetime.utcnow()
+        now = _utcnow()
+        user_data["created_at"] = now
+        user_data["last_login"] = now
 
         result = await self.db.users.insert_one(user_data)
         return str(result.inserted_id)
@@ -176,7 +345,7 @@ class Database:
     async def update_user(self, user_id: str, updates: Dict[str, Any]):
         """Update user data"""
         await self.db.users.update_one(
-            {"_id": ObjectId(user_id)},
+            {"_id": _object_id(user_id)},
             {"$set": updates}
         )
 
@@ -192,10 +361,17 @@ class Database:
         Returns:
             User preferences document or None if not found
         """
-        prefs = await self.db.user_preferences.find_one({"userId": ObjectId(user_id)})
-        if prefs:
-            serialize_document(prefs)
-        return prefs
+        cached = self._preferences_cache.get(user_id)
+        if cached and time.monotonic() - cached[0] < self.PREFERENCES_CACHE_TTL:
+            prefs = cached[1]
+        else:
+            prefs = await self.db.user_preferences.find_one({"userId": _object_id(user_id)})
+            if prefs:
+                serialize_document(prefs)
+            self._preferences_cache[user_id] = (time.monotonic(), prefs)
+
+        # Callers may modify the returned dict; keep the cached copy intact
+        return dict(prefs) if prefs else prefs
 
     async def update_user_preferences(
         self,
@@ -213,10 +389,11 @@ class Database:
             Creates preferences document if it doesn't exist (upsert)
         """
         await self.db.user_preferences.update_one(
-            {"userId": ObjectId(user_id)},
+            {"userId": _object_id(user_id)},
             {"$set": updates},
             upsert=True
         )
+        self._preferences_cache.pop(user_id, None)
 
     async def get_user_timezone(self, user_id: str) -> Optional[str]:
         """
@@ -251,12 +428,13 @@ class Database:
         assignment_data: Dict[str, Any]
     ) -> str:
         """Create a new assignment"""
+        now = _utcnow()
         assignment = {
             **assignment_data,
             "user_id": user_id,
             "status": "not_started",
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
+            "created_at": now,
+            "updated_at": now,
             "created_by": "ai_chat"
         }
 
@@ -265,7 +443,7 @@ class Database:
 
     async def get_assignment(self, assignment_id: str) -> Optional[Dict[str, Any]]:
         """Get assignment by ID"""
-        assignment = await self.db.assignments.find_one({"_id": ObjectId(assignment_id)})
+        assignment = await self.db.assignments.find_one({"_id": _object_id(assignment_id)})
         if assignment:
             serialize_document(assignment)
         return assignment
@@ -281,26 +459,40 @@ class Database:
         if status_filter != "all":
             query["status"] = status_filter
 
-        assignments = await self.db.assignments.find(query).to_list(length=100)
+        cursor = self.db.assignments.find(query).limit(100).batch_size(100)
 
         # Convert ObjectId and datetime to strings for JSON serialization
-        for assignment in assignments:
-            serialize_document(assignment)
-
-        return assignments
+        return [serialize_document(assignment) async for assignment in cursor]
 
     async def update_assignment(
         self,
         assignment_id: str,
-        updates: Dict[str, Any]
-    ):
-        """Update assignment"""
-        updates["updated_at"] = datetime.utcnow()
+        updates: Dict[str, Any],
+        user_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Update assignment and return it in one round-trip.
 
-        await self.db.assignments.update_one(
-            {"_id": ObjectId(assignment_id)},
-            {"$set": updates}
+        Args:
+            assignment_id: Assignment ID
+            updates: Fields to set
+            user_id: If given, only update an assignment owned by this user
+
+        Returns:
+            The updated assignment, or None if not found (or not owned by user_id)
+        """
+        updates["updated_at"] = _utcnow()
+
+        query = {"_id": _object_id(assignment_id)}
+        if user_id is not None:
+            query["user_id"] = user_id
+
+        assignment = await self.db.assignments.find_one_and_update(
+            query,
+            {"$set": updates},
+            return_document=ReturnDocument.AFTER
         )
+        return serialize_document(assignment) if assignment else None
 
     # ==================== TASK OPERATIONS ====================
 
@@ -316,15 +508,50 @@ class Database:
             "user_id": user_id,
             "assignment_id": assignment_id,
             "status": "pending",
-            "created_at": datetime.utcnow()
+            "created_at": _utcnow()
         }
 
         result = await self.db.subtasks.insert_one(task)
         return str(result.inserted_id)
 
+    async def create_tasks(
+        self,
+        user_id: str,
+        assignment_id: str,
+        tasks_data: List[Dict[str, Any]]
+    ) -> List[str]:
+        """
+        Create several subtasks for an assignment in one round-trip.
+
+        Args:
+            user_id: User ID
+            assignment_id: Assignment ID
+            tasks_data: Subtask fields, in order
+
+        Returns:
+            IDs of the created subtasks, in the same order as tasks_data
+        """
+        if not tasks_data:
+            return []
+
+        now = _utcnow()
+        tasks = [
+            {
+                **task_data,
+                "user_id": user_id,
+                "assignment_id": assignment_id,
+                "status": "pending",
+                "created_at": now
+            }
+            for task_data in tasks_data
+        ]
+
+        result = await self.db.subtasks.insert_many(tasks)
+        return [str(task_id) for task_id in result.inserted_ids]
+
     async def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
         """Get task by ID"""
-        task = await self.db.subtasks.find_one({"_id": ObjectId(task_id)})
+        task = await self.db.subtasks.find_one({"_id": _object_id(task_id)})
         if task:
             serialize_document(task)
         return task
@@ -334,26 +561,40 @@ class Database:
         assignment_id: str
     ) -> List[Dict[str, Any]]:
         """Get all tasks for an assignment"""
-        tasks = await self.db.subtasks.find(
+        cursor = self.db.subtasks.find(
             {"assignment_id": assignment_id}
-        ).sort("order_index", 1).to_list(length=100)
+        ).sort("order_index", 1).limit(100).batch_size(100)
 
         # Convert ObjectId and datetime to strings
-        for task in tasks:
-            serialize_document(task)
-
-        return tasks
+        return [serialize_document(task) async for task in cursor]
 
     async def update_task(
         self,
         task_id: str,
-        updates: Dict[str, Any]
-    ):
-        """Update task"""
-        await self.db.subtasks.update_one(
-            {"_id": ObjectId(task_id)},
-            {"$set": updates}
+        updates: Dict[str, Any],
+        user_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Update task and return it in one round-trip.
+
+        Args:
+            task_id: Task ID
+            updates: Fields to set
+            user_id: If given, only update a task owned by this user
+
+        Returns:
+            The updated task, or None if not found (or not owned by user_id)
+        """
+        query = {"_id": _object_id(task_id)}
+        if user_id is not None:
+            query["user_id"] = user_id
+
+        task = await self.db.subtasks.find_one_and_update(
+            query,
+            {"$set": updates},
+            return_document=ReturnDocument.AFTER
         )
+        return serialize_document(task) if task else None
 
     async def delete_task(self, task_id: str, user_id: str) -> bool:
         """
@@ -367,12 +608,15 @@ class Database:
             True if deleted, False if not found or unauthorized
         """
         # Verify ownership first
-        task = await self.get_task(task_id)
+        task = await self.db.subtasks.find_one(
+            {"_id": _object_id(task_id)},
+            self._OWNER_PROJECTION
+        )
         if not task or task.get("user_id") != user_id:
             return False
 
         result = await self.db.subtasks.delete_one({
-            "_id": ObjectId(task_id),
+            "_id": _object_id(task_id),
             "user_id": user_id  # Double-check authorization
         })
         return result.deleted_count > 0
@@ -388,22 +632,18 @@ class Database:
         Returns:
             Dict with counts: {"assignments_deleted": 1, "tasks_deleted": N}
         """
-        # Verify ownership first
-        assignment = await self.get_assignment(assignment_id)
-        if not assignment or assignment.get("user_id") != user_id:
-            return {"assignments_deleted": 0, "tasks_deleted": 0}
-
-        # Delete all tasks first
-        tasks_result = await self.db.subtasks.delete_many({
-            "assignment_id": assignment_id,
-            "user_id": user_id
-        })
-
-        # Delete assignment
-        assignment_result = await self.db.assignments.delete_one({
-            "_id": ObjectId(assignment_id),
-            "user_id": user_id
-        })
+        # Both filters include user_id, which is the authorization check;
+        # another user's assignment or tasks never match
+        tasks_result, assignment_result = await asyncio.gather(
+            self.db.subtasks.delete_many({
+                "assignment_id": assignment_id,
+                "user_id": user_id
+            }),
+            self.db.assignments.delete_one({
+                "_id": _object_id(assignment_id),
+                "user_id": user_id
+            })
+        )
 
         return {
             "assignments_deleted": assignment_result.deleted_count,
@@ -422,7 +662,10 @@ class Database:
             Number of tasks deleted
         """
         # Verify assignment ownership
-        assignment = await self.get_assignment(assignment_id)
+        assignment = await self.db.assignments.find_one(
+            {"_id": _object_id(assignment_id)},
+            self._OWNER_PROJECTION
+        )
         if not assignment or assignment.get("user_id") != user_id:
             return 0
 
@@ -453,9 +696,11 @@ class Database:
         """
         filters = {"user_id": user_id}
 
-        # Add title search (case-insensitive regex)
+        # Add title search (case-insensitive substring match). The regex is
+        # only evaluated on this user's tasks, which the user_id index narrows
+        # to; escaping keeps titles like "C++ lab" from being read as patterns
         if query:
-            filters["title"] = {"$regex": query, "$options": "i"}
+            filters["title"] = {"$regex": re.escape(query), "$options": "i"}
 
         # Add optional filters
         if assignment_id:
@@ -463,13 +708,57 @@ class Database:
         if status:
             filters["status"] = status
 
-        tasks = await self.db.subtasks.find(filters).sort("created_at", -1).to_list(length=100)
+        cursor = self.db.subtasks.find(filters).sort("created_at", -1).limit(100).batch_size(100)
 
         # Convert ObjectIds and datetime to strings
-        for task in tasks:
-            serialize_document(task)
+        return [serialize_document(task) async for task in cursor]
 
-        return tasks
+    async def _find_tasks_with_assignment(
+        self,
+        filters: Dict[str, Any],
+        sort: Dict[str, int],
+        limit: int,
+        assignment_fields: List[str]
+    ) -> List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """
+        Find tasks and join each with its assignment in one aggregation.
+
+        Args:
+            filters: Task query filters
+            sort: Sort specification, e.g. {"created_at": -1}
+            limit: Maximum number of tasks to return
+            assignment_fields: Assignment fields to return
+
+        Returns:
+            List of (serialized task, serialized assignment or None) pairs
+        """
+        pipeline = [
+            {"$match": filters},
+            {"$sort": sort},
+            {"$limit": limit},
+            {"$lookup": {
+                "from": "assignments",
+                "let": {"assignment_id": "$assignment_id"},
+                "pipeline": [
+                    # Tasks store assignment_id as a string; invalid IDs match nothing
+                    {"$match": {"$expr": {"$eq": ["$_id", {"$convert": {
+                        "input": "$$assignment_id",
+                        "to": "objectId",
+                        "onError": None,
+                        "onNull": None
+                    }}]}}},
+                    {"$project": {field: 1 for field in assignment_fields}}
+                ],
+                "as": "_assignment"
+            }}
+        ]
+
+        results = []
+        async for task in self.db.subtasks.aggregate(pipeline, batchSize=limit):
+            matches = task.pop("_assignment", None)
+            serialize_document(task)
+            results.append((task, serialize_document(matches[0]) if matches else None))
+        return results
 
     async def get_tasks_by_status(
         self,
@@ -488,21 +777,20 @@ class Database:
         Returns:
             List of tasks with assignment context
         """
-        tasks = await self.db.subtasks.find({
-            "user_id": user_id,
-            "status": status
-        }).sort("created_at", -1).to_list(length=limit)
-
-        # Convert ObjectIds/datetime and add assignment info
-        for task in tasks:
-            serialize_document(task)
+        results = await self._find_tasks_with_assignment(
+            {"user_id": user_id, "status": status},
+            {"created_at": -1},
+            limit,
+            ["title", "subject"]
+        )
 
-            # Fetch assignment details for context
-            if task.get("assignment_id"):
-                assignment = await self.get_assignment(task["assignment_id"])
-                if assignment:
-                    task["assignment_title"] = assignment.get("title", "Unknown")
-                    task["assignment_subject"] = assignment.get("subject", "")
+        # Add assignment info for context
+        tasks = []
+        for task, assignment in results:
+            if assignment:
+                task["assignment_title"] = assignment.get("title", "Unknown")
+                task["assignment_subject"] = assignment.get("subject", "")
+            tasks.append(task)
 
         return tasks
 
@@ -523,25 +811,28 @@ class Database:
         """
         from datetime import timedelta
 
-        now = datetime.utcnow()
+        now = _utcnow()
         future = now + timedelta(days=days_ahead)
 
-        tasks = await self.db.subtasks.find({
-            "user_id": user_id,
-            "scheduled_start": {
-                "$gte": now,
-                "$lte": future
-            }
-        }).sort("scheduled_start", 1).to_list(length=100)
-
-        # Convert ObjectIds/datetime and add assignment context
-        for task in tasks:
-            serialize_document(task)
+        results = await self._find_tasks_with_assignment(
+            {
+                "user_id": user_id,
+                "scheduled_start": {
+                    "$gte": now,
+                    "$lte": future
+                }
+            },
+            {"scheduled_start": 1},
+            100,
+            ["title"]
+        )
 
-            if task.get("assignment_id"):
-                assignment = await self.get_assignment(task["assignment_id"])
-                if assignment:
-                    task["assignment_title"] = assignment.get("title", "Unknown")
+        # Add assignment context
+        tasks = []
+        for task, assignment in results:
+            if assignment:
+                task["assignment_title"] = assignment.get("title", "Unknown")
+            tasks.append(task)
 
         return tasks
 
@@ -560,9 +851,41 @@ class Database:
             status_filter: Optional status filter ('all', 'pending', 'completed', etc.)
 
         Returns:
-            List of all tasks with assignment context
+            List of all tasks with assignment context (newest 500)
         """
-        filters = {"user_id": user_id}
+        tasks, _ = await self.get_user_tasks_page(
+            user_id,
+            assignment_id=assignment_id,
+            status_filter=status_filter,
+            page_size=500
+        )
+        return tasks
+
+    async def get_user_tasks_page(
+        self,
+        user_id: str,
+        assignment_id: Optional[str] = None,
+        status_filter: Optional[str] = None,
+        cursor: Optional[str] = None,
+        page_size: int = 100
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Get one page of a user's tasks, newest first, using keyset pagination.
+
+        Args:
+            user_id: User ID
+            assignment_id: Optional assignment filter
+            status_filter: Optional status filter ('all', 'pending', 'completed', etc.)
+            cursor: next_cursor from the previous page, or None for the first page
+            page_size: Maximum number of tasks per page
+
+        Returns:
+            Tuple of (tasks with assignment context, next_cursor or None on the last page)
+
+        Raises:
+            ValueError: If cursor is malformed
+        """
+        filters: Dict[str, Any] = {"user_id": user_id}
 
         if assignment_id:
             filters["assignment_id"] = assignment_id
@@ -570,16 +893,31 @@ class Database:
         if status_filter and status_filter != "all":
             filters["status"] = status_filter
 
-        tasks = await self.db.subtasks.find(filters).sort("created_at", -1).to_list(length=500)
+        if cursor:
+            # Resume strictly after the last (created_at, _id) of the previous page
+            created_at, last_id = _decode_task_cursor(cursor)
+            filters["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": last_id}}
+            ]
+
+        results = await self._find_tasks_with_assignment(
+            filters,
+            {"created_at": -1, "_id": -1},
+            page_size,
+            ["title", "due_date"]
+        )
 
-        # Convert ObjectIds/datetime and add assignment context
-        for task in tasks:
-            serialize_document(task)
+        # Add assignment context
+        tasks = []
+        for task, assignment in results:
+            if assignment:
+                task["assignment_title"] = assignment.get("title", "Unknown")
+                task["assignment_due_date"] = assignment.get("due_date")
+            tasks.append(task)
 
-            if task.get("assignment_id"):
-                assignment = await self.get_assignment(task["assignment_id"])
-                if assignment:
-                    task["assignment_title"] = assignment.get("title", "Unknown")
-                    task["assignment_due_date"] = assignment.get("due_date")
+        next_cursor = None
+        if len(tasks) == page_size and tasks[-1].get("created_at"):
+            next_cursor = _encode_task_cursor(tasks[-1])
 
-        return tasks
+        return tasks, next_cursor
@@ -2,18 +2,30 @@
 List available Gemini models
 """
 import os
+from functools import lru_cache
+from typing import List
+
 from dotenv import load_dotenv
 import google.generativeai as genai
 
-load_dotenv()
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+@lru_cache(maxsize=1)
+def list_content_models() -> List:
+    """Return the Gemini models that support generateContent (fetched once per process)."""
+    load_dotenv()
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+    return [
+        model for model in genai.list_models()
+        if 'generateContent' in model.supported_generation_methods
+    ]
+
 
-print("Available Gemini models that support generateContent:\n")
-print("-" * 80)
+if __name__ == "__main__":
+    print("Available Gemini models that support generateContent:\n")
+    print("-" * 80)
 
-for model in genai.list_models():
-    if 'generateContent' in model.supported_generation_methods:
+    for model in list_content_models():
         print(f"Model: {model.name}")
         print(f"  Display Name: {model.display_name}")
         print(f"  Supported Methods: {', '.join(model.supported_generation_methods)}")
@@ -9,18 +9,34 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, F
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
-from datetime import datetime
-from pypdf import PdfReader
-import io
+import time
+from datetime import datetime, timezone
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
 import asyncio
+import hashlib
+import orjson
 
-from ai.chat_handler import ChatHandler
+from ai.chat_handler import ChatHandler, CHARS_PER_TOKEN
 from database.connection import Database
-from services.function_executor import FunctionExecutor
+from services.function_executor import FunctionExecutor, close_http_client
+from utils.attachments import inline_attachments, carry_attachment_keys
+from utils.pdf_text import count_pages, extract_page_range
 
 # Load environment variables
 load_dotenv()
 
+# Configuration, resolved once at import time
+FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_CONFIGURED = bool(GEMINI_API_KEY)
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", 10 * 1024 * 1024))  # 10 MB default
+PDF_TEXT_CHAR_LIMIT = int(os.getenv("PDF_TEXT_CHAR_LIMIT", 6000))
+PDF_PREVIEW_CHAR_LIMIT = int(os.getenv("PDF_PREVIEW_CHAR_LIMIT", 350))
+PDF_READ_CHUNK_BYTES = 64 * 1024
+PDF_TEXT_CACHE_SIZE = int(os.getenv("PDF_TEXT_CACHE_SIZE", 128))  # 0 disables
+
 # Initialize FastAPI app
 app = FastAPI(
     title="SteadyStudy API",
@@ -31,17 +47,56 @@ app = FastAPI(
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[os.getenv("FRONTEND_URL", "http://localhost:3000")],
+    allow_origins=[FRONTEND_URL],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# In-memory chat history kept per WebSocket connection (user/model messages).
+# ChatHandler further trims what it sends to Gemini to a token budget.
+MAX_HISTORY_MESSAGES = 40
+HISTORY_TRIM_SLACK = 20
+
+# Seconds to wait for a reply before showing the typing indicator
+TYPING_INDICATOR_DELAY = 0.15
+
+# Worker processes for PDF text extraction (created on first upload)
+PDF_WORKERS = os.cpu_count() or 1
+PDF_PAGES_PER_TASK = 4
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+
+
+# Extracted text of recent uploads keyed by content hash (LRU):
+# blake2b digest -> (page count, truncated text)
+_pdf_text_cache: "OrderedDict[bytes, Tuple[int, str]]" = OrderedDict()
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """Get the shared PDF extraction process pool, creating it on first use."""
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    return _pdf_pool
+
+
+# Whole-second UTC timestamp for the status endpoints, formatted once per second
+_timestamp_cache = ["", 0]
+
+
+def now_iso() -> str:
+    """Get the current UTC time as an ISO 8601 string, at second granularity."""
+    now = int(time.time())
+    if now != _timestamp_cache[1]:
+        _timestamp_cache[:] = [datetime.fromtimestamp(now, timezone.utc).isoformat(), now]
+    return _timestamp_cache[0]
+
+
 # Initialize database
 db = Database()
 
 # Initialize Gemini chat handler
-chat_handler = ChatHandler(gemini_api_key=os.getenv("GEMINI_API_KEY"))
+chat_handler = ChatHandler(gemini_api_key=GEMINI_API_KEY)
 
 
 @app.on_event("startup")
@@ -56,6 +111,25 @@ async def shutdown_db_client():
     await db.close()
 
 
+@app.on_event("shutdown")
+async def shutdown_gemini_client():
+    """Close the Gemini gRPC channel on shutdown"""
+    await chat_handler.close()
+
+
+@app.on_event("shutdown")
+async def shutdown_http_client():
+    """Close the shared calendar API client on shutdown"""
+    await close_http_client()
+
+
+@app.on_event("shutdown")
+async def shutdown_pdf_pool():
+    """Stop the PDF extraction worker processes on shutdown"""
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(cancel_futures=True)
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -63,23 +137,33 @@ async def root():
         "status": "ok",
         "service": "SteadyStudy API",
         "version": "1.0.0",
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": now_iso()
     }
 
 
 @app.get("/health")
 async def health_check():
-    """Detailed health check"""
-    db_status = "connected" if db.is_connected() else "disconnected"
+    """Detailed health check (the database ping is cached for a few seconds)"""
+    db_status = "connected" if await db.ping() else "disconnected"
 
     return {
         "status": "healthy",
         "database": db_status,
-        "gemini_configured": bool(os.getenv("GEMINI_API_KEY")),
-        "timestamp": datetime.utcnow().isoformat()
+        "gemini_configured": GEMINI_CONFIGURED,
+        "timestamp": now_iso()
     }
 
 
+async def send_frame(websocket: WebSocket, payload: Dict[str, Any]):
+    """Send a JSON text frame, serialized with orjson (datetimes are handled natively)."""
+    await websocket.send_text(orjson.dumps(payload).decode())
+
+
+async def receive_frame(websocket: WebSocket) -> Dict[str, Any]:
+    """Receive a JSON text frame and parse it with orjson."""
+    return orjson.loads(await websocket.receive_text())
+
+
 @app.websocket("/ws/chat")
 async def websocket_chat(websocket: WebSocket):
     """
@@ -91,9 +175,23 @@ async def websocket_chat(websocket: WebSocket):
     await websocket.accept()
     user_id = None
 
+    # Chat messages are persisted in the background so DB latency stays off
+    # the reply path; outstanding writes are awaited before the handler exits
+    pending_writes = set()
+
+    def on_write_done(task: asyncio.Task):
+        pending_writes.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"Failed to save chat messages for user {user_id}: {task.exception()}")
+
+    def save_in_background(messages):
+        task = asyncio.create_task(db.save_messages(messages))
+        pending_writes.add(task)
+        task.add_done_callback(on_write_done)
+
     try:
         # First message should contain auth token
-        auth_data = await websocket.receive_json()
+        auth_data = await receive_frame(websocket)
 
         # TODO: Implement proper token verification
         # For now, accept user_id directly (NOT SECURE - implement auth later)
@@ -101,7 +199,7 @@ async def websocket_chat(websocket: WebSocket):
         auth_token = auth_data.get("token")
 
         if not user_id:
-            await websocket.send_json({
+            await send_frame(websocket, {
                 "error": "Unauthorized",
                 "message": "Please provide user_id"
             })
@@ -114,81 +212,127 @@ async def websocket_chat(websocket: WebSocket):
         # Load conversation history from database
         history = await db.get_chat_history(user_id, limit=20)
 
+        # Hashes of the attachment texts still in the model's context ->
+        # tokens of the conversation since each was inlined
+        inlined_attachment_tokens = {}
+
         # Note: Connection status is shown in UI header, not as a chat message
         # No need to send a "Connected" message here
 
-        # Main chat loop
-        while True:
-            # Receive message
-            data = await websocket.receive_json()
+        # Main chat loop; ends when the client disconnects
+        async for frame in websocket.iter_text():
+            data = orjson.loads(frame)
             user_message = data.get("message") or ""
             attachments = data.get("attachments") or []
 
             if not user_message and not attachments:
                 continue
 
-            # Save user message to database with attachments if provided
-            await db.save_message(user_id, "user", user_message, attachments=attachments or None)
-
-            augmented_message = user_message
-            if attachments:
-                attachment_descriptions = []
-                for attachment in attachments:
-                    filename = attachment.get("filename", "attachment")
-                    attachment_text = attachment.get("extracted_text") or attachment.get("preview")
-                    if attachment_text:
-                        attachment_descriptions.append(
-                            f"[Attachment: {filename}]\n{attachment_text}"
-                        )
-                if attachment_descriptions:
-                    if augmented_message:
-                        augmented_message += "\n\n"
-                    augmented_message += "\n\n".join(attachment_descriptions)
-
-            # Send typing indicator
-            await websocket.send_json({
-                "type": "typing",
-                "message": "AI is thinking..."
-            })
+            # Timestamp the user message now; it is saved together with the reply
+            user_record = db.build_message(user_id, "user", user_message, attachments=attachments or None)
+
+            # Inline attachment text, except for attachments whose text is
+            # still in context (or earlier in this message)
+            augmented_message, turn_attachment_keys = inline_attachments(
+                user_message,
+                attachments,
+                inlined_attachment_tokens
+            )
+
+            # Send the typing indicator only if the reply is not ready within
+            # TYPING_INDICATOR_DELAY; cached and shortcut replies skip the frame
+            replied = asyncio.Event()
+
+            async def send_typing():
+                try:
+                    async with asyncio.timeout(TYPING_INDICATOR_DELAY):
+                        await replied.wait()
+                except TimeoutError:
+                    if not replied.is_set():
+                        await send_frame(websocket, {
+                            "type": "typing",
+                            "message": "AI is thinking..."
+                        })
+
+            typing_task = asyncio.create_task(send_typing())
+
+            # Stream new text to the client as it arrives (deltas only);
+            # the final "message" event carries the complete reply
+            async def send_delta(delta: str):
+                replied.set()
+                await send_frame(websocket, {
+                    "type": "delta",
+                    "delta": delta
+                })
 
             # Process with Gemini AI with 2-minute timeout
             try:
-                response = await asyncio.wait_for(
-                    chat_handler.process_message(
+                async with asyncio.timeout(120.0):  # 2 minutes
+                    response = await chat_handler.process_message(
                         augmented_message,
                         user_id,
                         history,
-                        function_executor
-                    ),
-                    timeout=120.0  # 2 minutes
-                )
-            except asyncio.TimeoutError:
-                await websocket.send_json({
+                        function_executor,
+                        on_delta=send_delta
+                    )
+            except TimeoutError:
+                save_in_background([user_record])
+                await send_frame(websocket, {
                     "type": "error",
                     "message": "AI response timed out after 2 minutes. Please try a simpler request or break it into smaller parts."
                 })
                 continue
-
-            # Save AI response to database
-            await db.save_message(
-                user_id,
-                "model",  # Gemini uses "model" role
-                response["message"],
-                function_calls=response["function_calls"]
-            )
+            except Exception:
+                # Keep the user's message even if the turn fails
+                save_in_background([user_record])
+                raise
+            finally:
+                # Let a typing frame already being sent go out before the reply
+                replied.set()
+                await asyncio.gather(typing_task, return_exceptions=True)
+
+            # Save the user message and AI response in one round-trip
+            save_in_background([
+                user_record,
+                db.build_message(
+                    user_id,
+                    "model",  # Gemini uses "model" role
+                    response["message"],
+                    function_calls=response["function_calls"]
+                )
+            ])
 
             # Send response to client
-            await websocket.send_json({
+            await send_frame(websocket, {
                 "type": "message",
                 "message": response["message"],
                 "function_calls": response["function_calls"],
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": datetime.now(timezone.utc)
             })
 
             # Update history
             history.append({"role": "user", "content": augmented_message})
             history.append({"role": "model", "content": response["message"]})
 
+            # An inlined text stays in Gemini's context while the exchanges
+            # since it fit the history budget
+            turn_tokens = (len(augmented_message) + len(response["message"])) // CHARS_PER_TOKEN
+            inlined_attachment_tokens = carry_attachment_keys(
+                inlined_attachment_tokens,
+                turn_attachment_keys,
+                turn_tokens,
+                chat_handler.max_history_tokens
+            )
+
+            # Keep the session's history bounded. Trimming is batched so it
+            # happens rarely: a new list makes ChatHandler rebuild its session.
+            # The trim may drop messages that carried attachment text
+            if len(history) > MAX_HISTORY_MESSAGES + HISTORY_TRIM_SLACK:
+                history = history[-MAX_HISTORY_MESSAGES:]
+                inlined_attachment_tokens = {}
+
+        print(f"WebSocket disconnected for user: {user_id}")
+
     except WebSocketDisconnect:
         print(f"WebSocket disconnected for user: {user_id}")
     except Exception as e:
@@ -197,61 +341,126 @@ async def websocket_chat(websocket: WebSocket):
         print("Full traceback:")
         traceback.print_exc()
         try:
-            await websocket.send_json({
+            await send_frame(websocket, {
                 "type": "error",
                 "message": f"An error occurred: {str(e)}"
             })
         except:
             pass
+    finally:
+        if pending_writes:
+            await asyncio.gather(*pending_writes, return_exceptions=True)
 
 
-@app.post("/chat/upload-pdf")
-async def upload_assignment_pdf(
-    file: UploadFile = File(...),
-    user_id: str = Form(...),
-    token: str = Form(None)
-):
-    """
-    Accept assignment PDFs, extract text, and store them as chat attachments.
+async def extract_pdf_text(file_bytes: bytes) -> Tuple[int, str]:
     """
-    if not user_id:
-        raise HTTPException(status_code=400, detail="user_id is required")
+    Extract the text of a PDF, truncated to PDF_TEXT_CHAR_LIMIT.
 
-    if not file.filename.lower().endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Only PDF uploads are supported")
+    Args:
+        file_bytes: Raw PDF file contents
 
-    file_bytes = await file.read()
-    max_file_size = int(os.getenv("PDF_MAX_BYTES", 10 * 1024 * 1024))  # 10 MB default
-    if len(file_bytes) > max_file_size:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File is too large. Maximum size is {max_file_size // (1024 * 1024)} MB"
-        )
+    Returns:
+        Tuple of (page count, extracted text)
+
+    Raises:
+        HTTPException: If the PDF cannot be read or contains no text
+    """
+    # All parsing happens in the pool, never on the event loop
+    loop = asyncio.get_running_loop()
+    pool = get_pdf_pool()
 
     try:
-        reader = PdfReader(io.BytesIO(file_bytes))
+        pages = await loop.run_in_executor(pool, count_pages, file_bytes)
     except Exception as exc:
         raise HTTPException(status_code=400, detail=f"Failed to read PDF: {str(exc)}")
 
+    char_limit = PDF_TEXT_CHAR_LIMIT
+
+    # Extract text in waves of one page range per worker, and stop once the
+    # text is already past char_limit (the rest would be truncated anyway).
+    # Each task is sent the whole file and parses it again, so
+    # PDF_PAGES_PER_TASK trades that repeated parse against stopping early
+    wave_size = PDF_WORKERS * PDF_PAGES_PER_TASK
     extracted_text = []
-    for page in reader.pages:
-        page_text = page.extract_text() or ""
-        extracted_text.append(page_text.strip())
+    for wave_start in range(0, pages, wave_size):
+        wave_stop = min(wave_start + wave_size, pages)
+        chunks = await asyncio.gather(*(
+            loop.run_in_executor(
+                pool,
+                extract_page_range,
+                file_bytes,
+                start,
+                min(start + PDF_PAGES_PER_TASK, wave_stop)
+            )
+            for start in range(wave_start, wave_stop, PDF_PAGES_PER_TASK)
+        ))
+        extracted_text.extend(page_text for chunk in chunks for page_text in chunk if page_text)
+
+        # Length of the joined text, counting the "\n\n" separators
+        text_length = sum(map(len, extracted_text)) + 2 * (len(extracted_text) - 1)
+        if text_length > char_limit:
+            break
 
-    full_text = "\n\n".join(filter(None, extracted_text)).strip()
+    full_text = "\n\n".join(extracted_text)
 
     if not full_text:
         raise HTTPException(status_code=400, detail="Unable to extract text from PDF")
 
-    char_limit = int(os.getenv("PDF_TEXT_CHAR_LIMIT", 6000))
     truncated_text = full_text[:char_limit]
     if len(full_text) > char_limit:
         truncated_text += "\n\n[Text truncated for processing]"
 
-    pages = len(reader.pages)
+    return pages, truncated_text
+
+
+@app.post("/chat/upload-pdf")
+async def upload_assignment_pdf(
+    file: UploadFile = File(...),
+    user_id: str = Form(...),
+    token: str = Form(None)
+):
+    """
+    Accept assignment PDFs, extract text, and store them as chat attachments.
+    """
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id is required")
+
+    if not file.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF uploads are supported")
+
+    too_large = HTTPException(
+        status_code=400,
+        detail=f"File is too large. Maximum size is {PDF_MAX_BYTES // (1024 * 1024)} MB"
+    )
+
+    # Reject by declared size first, then read in chunks and stop as soon as
+    # the limit is passed so an oversized upload is never fully buffered
+    if file.size is not None and file.size > PDF_MAX_BYTES:
+        raise too_large
+
+    buffer = bytearray()
+    while chunk := await file.read(PDF_READ_CHUNK_BYTES):
+        buffer += chunk
+        if len(buffer) > PDF_MAX_BYTES:
+            raise too_large
+    file_bytes = bytes(buffer)
+
+    # Identical re-uploads reuse the text extracted the first time
+    cache_key = hashlib.blake2b(file_bytes, digest_size=16).digest()
+    cached = _pdf_text_cache.get(cache_key)
+    if cached is not None:
+        _pdf_text_cache.move_to_end(cache_key)
+        pages, truncated_text = cached
+    else:
+        pages, truncated_text = await extract_pdf_text(file_bytes)
+        if PDF_TEXT_CACHE_SIZE > 0:
+            _pdf_text_cache[cache_key] = (pages, truncated_text)
+            while len(_pdf_text_cache) > PDF_TEXT_CACHE_SIZE:
+                _pdf_text_cache.popitem(last=False)
+
     size_kb = round(len(file_bytes) / 1024, 1)
 
-    preview_limit = int(os.getenv("PDF_PREVIEW_CHAR_LIMIT", 350))
+    preview_limit = PDF_PREVIEW_CHAR_LIMIT
     preview_text = truncated_text[:preview_limit].strip()
     if len(truncated_text) > preview_limit:
         preview_text += "…"
@@ -9,6 +9,7 @@ from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, timedelta, timezone
 from dateutil import parser
 import httpx
+import orjson
 import os
 import time
 import uuid
@@ -43,6 +44,9 @@ except ImportError:
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Tasks returned per get_all_user_tasks call; later pages via next_cursor
+ALL_TASKS_PAGE_SIZE = 500
+
 
 class CalendarCache:
     """
@@ -142,6 +146,29 @@ class CalendarCache:
 # Global calendar cache instance
 _calendar_cache = CalendarCache(ttl_seconds=60)
 
+# Shared HTTP client for the calendar API, so keep-alive connections are
+# reused across calls (created on first use, closed on app shutdown)
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared calendar API client, creating it on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50)
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared calendar API client."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 
 class FunctionExecutor:
     """
@@ -239,8 +266,8 @@ class FunctionExecutor:
             max_task_duration = study_settings.get("maxTaskDuration", 120)
             min_task_duration = 15  # Minimum 15 minutes for any task
 
-            # Create subtasks in database with order_index
-            task_ids = []
+            # Build subtasks with order_index, then create them in one batch
+            subtasks_data = []
             total_minutes = 0
             clamping_applied = []
 
@@ -271,28 +298,26 @@ class FunctionExecutor:
                 }
 
                 total_minutes += subtask_data["estimated_duration"]
-
-                task_id = await self.db.create_task(
-                    self.user_id,
-                    assignment_id,
-                    subtask_data
-                )
-                print(f"✅ Created subtask with ID: {task_id}")
-                print(f"   User ID: {self.user_id}")
-                print(f"   Assignment ID: {assignment_id}")
-                print(f"   Title: {subtask_data['title']}")
-                print(f"   Status: pending")
-                task_ids.append(task_id)
+                subtasks_data.append(subtask_data)
 
             # Calculate total hours
             total_hours = total_minutes / 60
 
-            # Update assignment with total hours
+            # Insert the subtasks, then record their total only once the insert succeeded
+            task_ids = await self.db.create_tasks(self.user_id, assignment_id, subtasks_data)
+
             await self.db.update_assignment(
                 assignment_id,
                 {"total_estimated_hours": total_hours}
             )
 
+            for task_id, subtask_data in zip(task_ids, subtasks_data):
+                print(f"✅ Created subtask with ID: {task_id}")
+                print(f"   User ID: {self.user_id}")
+                print(f"   Assignment ID: {assignment_id}")
+                print(f"   Title: {subtask_data['title']}")
+                print(f"   Status: pending")
+
             result = {
                 "success": True,
                 "subtasks_created": len(subtasks),
@@ -376,9 +401,12 @@ class FunctionExecutor:
             Dict with scheduled tasks
         """
         try:
-            assignment = await self.db.get_assignment(assignment_id)
-            tasks = await self.db.get_assignment_tasks(assignment_id)
-            preferences = await self.db.get_user_preferences(user_id)
+            # Independent reads, fetched concurrently
+            assignment, tasks, preferences = await asyncio.gather(
+                self.db.get_assignment(assignment_id),
+                self.db.get_assignment_tasks(assignment_id),
+                self.db.get_user_preferences(user_id)
+            )
 
             if not assignment:
                 return {"success": False, "error": "Assignment not found"}
@@ -478,70 +506,70 @@ class FunctionExecutor:
 
                     try:
                         # Call calendar API to create event
-                        async with httpx.AsyncClient() as client:
-                            response = await client.post(
-                                f"{self.api_base_url}/api/calendar/create-events",
-                                json={"tasks": [task_data]},
-                                headers={"Authorization": f"Bearer {self.auth_token}"},
-                                timeout=30.0
-                            )
+                        client = get_http_client()
+                        response = await client.post(
+                            f"{self.api_base_url}/api/calendar/create-events",
+                            json={"tasks": [task_data]},
+                            headers={"Authorization": f"Bearer {self.auth_token}"},
+                            timeout=30.0
+                        )
 
-                            print(f"\n{'='*60}")
-                            print(f"📡 CALENDAR API RESPONSE")
-                            print(f"   Status Code: {response.status_code}")
-                            print(f"   Response Body: {response.text}")
-                            print(f"{'='*60}\n")
+                        print(f"\n{'='*60}")
+                        print(f"📡 CALENDAR API RESPONSE")
+                        print(f"   Status Code: {response.status_code}")
+                        print(f"   Response Body: {response.text}")
+                        print(f"{'='*60}\n")
 
-                            if response.status_code == 200:
-                                result = response.json()
-                                created_events = result.get("created_events", [])
-                                errors = result.get("errors", [])
+                        if response.status_code == 200:
+                            result = orjson.loads(response.content)
+                            created_events = result.get("created_events", [])
+                            errors = result.get("errors", [])
 
-                                print(f"\n{'='*60}")
-                                print(f"📊 CALENDAR API RESULT")
-                                print(f"   Created events: {len(created_events)}")
-                                print(f"   Errors: {len(errors)}")
-                                if created_events:
-                                    print(f"   Event ID: {created_events[0].get('id')}")
-                                    print(f"   Event details: {created_events[0]}")
-                                if errors:
-                                    print(f"   Error details: {errors}")
-                                print(f"{'='*60}\n")
+                            print(f"\n{'='*60}")
+                            print(f"📊 CALENDAR API RESULT")
+                            print(f"   Created events: {len(created_events)}")
+                            print(f"   Errors: {len(errors)}")
+                            if created_events:
+                                print(f"   Event ID: {created_events[0].get('id')}")
+                                print(f"   Event details: {created_events[0]}")
+                            if errors:
+                                print(f"   Error details: {errors}")
+                            print(f"{'='*60}\n")
 
-                                if len(created_events) > 0:
-                                    # Success - update task in database
-                                    await self.db.update_task(task_id, {
-                                        "scheduled_start": proposed_start,
-                                        "scheduled_end": proposed_end,
-                                        "status": "scheduled"
-                                    })
+                            if len(created_events) > 0:
+                                # Success - update task in database
+                                await self.db.update_task(task_id, {
+                                    "scheduled_start": proposed_start,
+                                    "scheduled_end": proposed_end,
+                                    "status": "scheduled"
+                                })
 
-                                    scheduled_tasks.append({
-                                        "task_id": task_id,
-                                        "task_title": task_title,
-                                        "start": start_iso,
-                                        "end": end_iso,
-                                        "created": True,
-                                        "event_id": created_events[0].get("id")
-                                    })
-                                    print(f"   ✅ Successfully scheduled '{task_title}' (Event ID: {created_events[0].get('id')})")
-                                else:
-                                    # Event creation failed
-                                    error_msg = errors[0] if errors else "Unknown error"
-                                    print(f"   ❌ Failed to create calendar event: {error_msg}")
-                                    failed_tasks.append({
-                                        "task_id": task_id,
-                                        "task_title": task_title,
-                                        "error": str(error_msg)
-                                    })
+                                scheduled_tasks.append({
+                                    "task_id": task_id,
+                                    "task_title": task_title,
+                                    "start": start_iso,
+                                    "end": end_iso,
+                                    "created": True,
+                                    "event_id": created_events[0].get("id")
+                                })
+                                print(f"   ✅ Successfully scheduled '{task_title}' (Event ID: {created_events[0].get('id')})")
                             else:
-                                error_msg = f"API returned status {response.status_code}: {response.text[:200]}"
-                                print(f"   ❌ Calendar API error: {error_msg}")
+                                # Event creation failed
+                                error_msg = errors[0] if errors else "Unknown error"
+                                print(f"   ❌ Failed to create calendar event: {error_msg}")
                                 failed_tasks.append({
                                     "task_id": task_id,
                                     "task_title": task_title,
-                                    "error": error_msg
+                                    "error": str(error_msg)
                                 })
+                        else:
+                            error_msg = f"API returned status {response.status_code}: {response.text[:200]}"
+                            print(f"   ❌ Calendar API error: {error_msg}")
+                            failed_tasks.append({
+                                "task_id": task_id,
+                                "task_title": task_title,
+                                "error": error_msg
+                            })
 
                     except Exception as e:
                         import traceback
@@ -1105,116 +1133,116 @@ class FunctionExecutor:
                         print(f"   Auth token present: {bool(self.auth_token)}")
                         print(f"{'='*60}\n")
 
-                        async with httpx.AsyncClient() as client:
-                            response = await client.post(
-                                f"{self.api_base_url}/api/calendar/create-events",
-                                json={"tasks": [task_data]},  # Single task
-                                headers={"Authorization": f"Bearer {self.auth_token}"},
-                                timeout=30.0
-                            )
-
-                            print(f"\n{'='*60}")
-                            print(f"📡 CALENDAR API RESPONSE")
-                            print(f"   Status Code: {response.status_code}")
-                            print(f"   Response Body: {response.text[:500]}")
-                            print(f"{'='*60}\n")
+                        client = get_http_client()
+                        response = await client.post(
+                            f"{self.api_base_url}/api/calendar/create-events",
+                            json={"tasks": [task_data]},  # Single task
+                            headers={"Authorization": f"Bearer {self.auth_token}"},
+                            timeout=30.0
+                        )
 
-                            if response.status_code == 200:
-                                result = response.json()
-                                created_events = result.get("created_events", [])
-                                errors = result.get("errors", [])
+                        print(f"\n{'='*60}")
+                        print(f"📡 CALENDAR API RESPONSE")
+                        print(f"   Status Code: {response.status_code}")
+                        print(f"   Response Body: {response.text[:500]}")
+                        print(f"{'='*60}\n")
 
-                                print(f"\n{'='*60}")
-                                print(f"✅ CALENDAR API SUCCESS (200 OK)")
-                                print(f"   Created events: {len(created_events)}")
-                                print(f"   Errors: {len(errors)}")
-                                if created_events:
-                                    print(f"   Event ID: {created_events[0].get('id')}")
-                                    print(f"   Event details: {created_events[0]}")
-                                if errors:
-                                    print(f"   Error details: {errors}")
-                                print(f"{'='*60}\n")
+                        if response.status_code == 200:
+                            result = orjson.loads(response.content)
+                            created_events = result.get("created_events", [])
+                            errors = result.get("errors", [])
 
-                                if len(created_events) > 0:
-                                    # Success!
-                                    logger.info(
-                                        "ATOMIC_CREATE_SUCCESS",
-                                        extra={
-                                            "session_id": session_id,
-                                            "task_id": task_id,
-                                            "attempt": attempt + 1,
-                                            "event_id": created_events[0].get("id")
-                                        }
-                                    )
-
-                                    # Clear cache so next fetch gets fresh data
-                                    _calendar_cache.clear_user(user_id)
+                            print(f"\n{'='*60}")
+                            print(f"✅ CALENDAR API SUCCESS (200 OK)")
+                            print(f"   Created events: {len(created_events)}")
+                            print(f"   Errors: {len(errors)}")
+                            if created_events:
+                                print(f"   Event ID: {created_events[0].get('id')}")
+                                print(f"   Event details: {created_events[0]}")
+                            if errors:
+                                print(f"   Error details: {errors}")
+                            print(f"{'='*60}\n")
 
-                                    return {
-                                        "success": True,
-                                        "event": created_events[0],
-                                        "attempts": attempt + 1
+                            if len(created_events) > 0:
+                                # Success!
+                                logger.info(
+                                    "ATOMIC_CREATE_SUCCESS",
+                                    extra={
+                                        "session_id": session_id,
+                                        "task_id": task_id,
+                                        "attempt": attempt + 1,
+                                        "event_id": created_events[0].get("id")
                                     }
-                                else:
-                                    # Event creation failed
-                                    error_msg = errors[0] if errors else "Unknown error"
-
-                                    print(f"\n{'='*60}")
-                                    print(f"❌ CALENDAR EVENT CREATION FAILED")
-                                    print(f"   Error: {error_msg}")
-                                    print(f"   Full result: {result}")
-                                    print(f"{'='*60}\n")
-
-                                    logger.error(
-                                        "ATOMIC_CREATE_FAILED",
-                                        extra={
-                                            "session_id": session_id,
-                                            "task_id": task_id,
-                                            "attempt": attempt + 1,
-                                            "error": error_msg
-                                        }
-                                    )
+                                )
 
-                                    # Check if it's a conflict error from Google Calendar
-                                    if "conflict" in str(error_msg).lower() or "overlap" in str(error_msg).lower():
-                                        return {
-                                            "success": False,
-                                            "error": "CONFLICT_DETECTED",
-                                            "message": str(error_msg),
-                                            "retry": attempt < max_retries - 1
-                                        }
+                                # Clear cache so next fetch gets fresh data
+                                _calendar_cache.clear_user(user_id)
 
-                                    # Other error - don't retry
-                                    return {
-                                        "success": False,
-                                        "error": "API_ERROR",
-                                        "message": str(error_msg)
-                                    }
+                                return {
+                                    "success": True,
+                                    "event": created_events[0],
+                                    "attempts": attempt + 1
+                                }
                             else:
+                                # Event creation failed
+                                error_msg = errors[0] if errors else "Unknown error"
+
                                 print(f"\n{'='*60}")
-                                print(f"❌ CALENDAR API ERROR (Status {response.status_code})")
-                                print(f"   Response: {response.text}")
-                                print(f"   Will retry: {response.status_code >= 500 and attempt < max_retries - 1}")
+                                print(f"❌ CALENDAR EVENT CREATION FAILED")
+                                print(f"   Error: {error_msg}")
+                                print(f"   Full result: {result}")
                                 print(f"{'='*60}\n")
 
                                 logger.error(
-                                    "ATOMIC_CREATE_API_ERROR",
+                                    "ATOMIC_CREATE_FAILED",
                                     extra={
                                         "session_id": session_id,
                                         "task_id": task_id,
                                         "attempt": attempt + 1,
-                                        "status_code": response.status_code,
-                                        "response": response.text
+                                        "error": error_msg
                                     }
                                 )
-                                # Retry on server errors
-                                if response.status_code >= 500 and attempt < max_retries - 1:
-                                    continue
+
+                                # Check if it's a conflict error from Google Calendar
+                                if "conflict" in str(error_msg).lower() or "overlap" in str(error_msg).lower():
+                                    return {
+                                        "success": False,
+                                        "error": "CONFLICT_DETECTED",
+                                        "message": str(error_msg),
+                                        "retry": attempt < max_retries - 1
+                                    }
+
+                                # Other error - don't retry
                                 return {
                                     "success": False,
                                     "error": "API_ERROR",
-                                    "message": f"API returned {response.status_code}: {response.text[:200]}"
+                                    "message": str(error_msg)
+                                }
+                        else:
+                            print(f"\n{'='*60}")
+                            print(f"❌ CALENDAR API ERROR (Status {response.status_code})")
+                            print(f"   Response: {response.text}")
+                            print(f"   Will retry: {response.status_code >= 500 and attempt < max_retries - 1}")
+                            print(f"{'='*60}\n")
+
+                            logger.error(
+                                "ATOMIC_CREATE_API_ERROR",
+                                extra={
+                                    "session_id": session_id,
+                                    "task_id": task_id,
+                                    "attempt": attempt + 1,
+                                    "status_code": response.status_code,
+                                    "response": response.text
                                 }
+                            )
+                            # Retry on server errors
+                            if response.status_code >= 500 and attempt < max_retries - 1:
+                                continue
+                            return {
+                                "success": False,
+                                "error": "API_ERROR",
+                                "message": f"API returned {response.status_code}: {response.text[:200]}"
+                            }
 
                     except Exception as e:
                         import traceback
@@ -1828,35 +1856,35 @@ class FunctionExecutor:
             print(f"DEBUG: URL: {url}")
             print(f"DEBUG: Params: {params}")
 
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url,
-                    params=params,
-                    headers={"Authorization": f"Bearer {self.auth_token}"},
-                    timeout=30.0
-                )
+            client = get_http_client()
+            response = await client.get(
+                url,
+                params=params,
+                headers={"Authorization": f"Bearer {self.auth_token}"},
+                timeout=30.0
+            )
 
-                print(f"DEBUG: Response status: {response.status_code}")
-                print(f"DEBUG: Response body: {response.text}")
-
-                if response.status_code == 200:
-                    data = response.json()
-                    events = data.get("events", [])
-                    print(f"DEBUG: Successfully fetched {len(events)} events")
-                    for i, event in enumerate(events):
-                        print(f"DEBUG: Event {i+1}: {event.get('title')} - {event.get('start')}")
-                    return {
-                        "success": True,
-                        "events": events,
-                        "message": f"Found {len(events)} events"
-                    }
-                else:
-                    print(f"ERROR: Calendar API returned {response.status_code}")
-                    return {
-                        "success": False,
-                        "events": [],
-                        "message": f"Calendar API error: {response.status_code}"
-                    }
+            print(f"DEBUG: Response status: {response.status_code}")
+            print(f"DEBUG: Response body: {response.text}")
+
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                events = data.get("events", [])
+                print(f"DEBUG: Successfully fetched {len(events)} events")
+                for i, event in enumerate(events):
+                    print(f"DEBUG: Event {i+1}: {event.get('title')} - {event.get('start')}")
+                return {
+                    "success": True,
+                    "events": events,
+                    "message": f"Found {len(events)} events"
+                }
+            else:
+                print(f"ERROR: Calendar API returned {response.status_code}")
+                return {
+                    "success": False,
+                    "events": [],
+                    "message": f"Calendar API error: {response.status_code}"
+                }
         except Exception as e:
             print(f"ERROR: Failed to fetch calendar events: {type(e).__name__}: {e}")
             import traceback
@@ -2732,11 +2760,6 @@ class FunctionExecutor:
             Dict with success status and updated fields
         """
         try:
-            # Verify task ownership
-            task = await self.db.get_task(task_id)
-            if not task or task.get("user_id") != user_id:
-                return {"success": False, "error": "Task not found or unauthorized"}
-
             # Build updates dict
             updates = {}
             if title:
@@ -2757,8 +2780,10 @@ class FunctionExecutor:
             if not updates:
                 return {"success": False, "error": "No updates provided"}
 
-            # Update task
-            await self.db.update_task(task_id, updates)
+            # Update task (ownership is enforced by the update filter)
+            task = await self.db.update_task(task_id, updates, user_id=user_id)
+            if not task:
+                return {"success": False, "error": "Task not found or unauthorized"}
 
             return {
                 "success": True,
@@ -2798,11 +2823,6 @@ class FunctionExecutor:
             Dict with success status and updated fields
         """
         try:
-            # Verify assignment ownership
-            assignment = await self.db.get_assignment(assignment_id)
-            if not assignment or assignment.get("user_id") != user_id:
-                return {"success": False, "error": "Assignment not found or unauthorized"}
-
             # Build updates dict
             updates = {}
             if title:
@@ -2819,8 +2839,10 @@ class FunctionExecutor:
             if not updates:
                 return {"success": False, "error": "No updates provided"}
 
-            # Update assignment
-            await self.db.update_assignment(assignment_id, updates)
+            # Update assignment (ownership is enforced by the update filter)
+            assignment = await self.db.update_assignment(assignment_id, updates, user_id=user_id)
+            if not assignment:
+                return {"success": False, "error": "Assignment not found or unauthorized"}
 
             return {
                 "success": True,
@@ -2906,36 +2928,47 @@ class FunctionExecutor:
         self,
         user_id: str,
         assignment_id: Optional[str] = None,
-        status_filter: Optional[str] = None
+        status_filter: Optional[str] = None,
+        cursor: Optional[str] = None
     ) -> Dict[str, Any]:
         """
-        Get all tasks for user with optional filters.
+        Get all tasks for user with optional filters, one page at a time.
 
         Args:
             user_id: User ID
             assignment_id: Optional assignment filter
             status_filter: Optional status filter
+            cursor: next_cursor from the previous page, or None for the first page
 
         Returns:
-            Dict with tasks list
+            Dict with tasks list and next_cursor (None on the last page)
         """
         try:
-            tasks = await self.db.get_all_user_tasks(
+            tasks, next_cursor = await self.db.get_user_tasks_page(
                 user_id=user_id,
                 assignment_id=assignment_id,
-                status_filter=status_filter
+                status_filter=status_filter,
+                cursor=cursor,
+                page_size=ALL_TASKS_PAGE_SIZE
             )
 
             return {
                 "success": True,
                 "tasks": tasks,
                 "count": len(tasks),
+                "next_cursor": next_cursor,
                 "filters": {
                     "assignment_id": assignment_id,
                     "status": status_filter
                 }
             }
 
+        except ValueError:
+            return {
+                "success": False,
+                "error": "Invalid cursor. Pass next_cursor from the previous get_all_user_tasks result, or omit it for the first page."
+            }
+
         except Exception as e:
             return {
                 "success": False,
@@ -0,0 +1,11 @@
+"""
+Shared pytest setup for backend tests.
+
+Backend modules import each other as top-level packages (``ai``,
+``database``, ``utils``), as they do when the app runs from backend/.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,51 @@
+"""
+Tests for inlining attachment text into chat messages once.
+"""
+
+from utils.attachments import inline_attachments, carry_attachment_keys
+
+SYLLABUS = {"filename": "syllabus.pdf", "extracted_text": "Week 1: Intro. Week 2: Essays."}
+
+
+def _turn(inlined_tokens, turn_tokens=100, max_tokens=10_000):
+    """Run one chat turn carrying the same attachment."""
+    message, turn_keys = inline_attachments("About this file", [SYLLABUS], inlined_tokens)
+    return message, carry_attachment_keys(inlined_tokens, turn_keys, turn_tokens, max_tokens)
+
+
+def test_same_attachment_is_inlined_once_across_three_turns():
+    first, inlined_tokens = _turn({})
+    second, inlined_tokens = _turn(inlined_tokens)
+    third, inlined_tokens = _turn(inlined_tokens)
+
+    assert SYLLABUS["extracted_text"] in first
+    assert second.endswith("[Attachment: syllabus.pdf (see above)]")
+    assert third.endswith("[Attachment: syllabus.pdf (see above)]")
+
+
+def test_attachment_is_inlined_again_once_out_of_budget():
+    # The first turn still fits the budget alongside the second, not the third
+    first, inlined_tokens = _turn({}, turn_tokens=400, max_tokens=1000)
+    second, inlined_tokens = _turn(inlined_tokens, turn_tokens=400, max_tokens=1000)
+    third, inlined_tokens = _turn(inlined_tokens, turn_tokens=400, max_tokens=1000)
+    fourth, inlined_tokens = _turn(inlined_tokens, turn_tokens=400, max_tokens=1000)
+
+    assert SYLLABUS["extracted_text"] in first
+    assert "(see above)" in second
+    assert "(see above)" in third
+    assert SYLLABUS["extracted_text"] in fourth
+
+
+def test_oversized_turn_is_not_carried():
+    _, inlined_tokens = _turn({}, turn_tokens=20_000)
+    second, _ = _turn(inlined_tokens)
+
+    assert SYLLABUS["extracted_text"] in second
+
+
+def test_duplicate_within_one_message_is_referenced():
+    message, turn_keys = inline_attachments("Two copies", [SYLLABUS, dict(SYLLABUS)], {})
+
+    assert message.count(SYLLABUS["extracted_text"]) == 1
+    assert "(see above)" in message
+    assert len(turn_keys) == 1
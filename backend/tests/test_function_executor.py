@@ -0,0 +1,68 @@
+"""
+Tests for FunctionExecutor database write ordering.
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("orjson")
+pytest.importorskip("dateutil")
+
+from services.function_executor import FunctionExecutor
+
+
+class FakeDatabase:
+    """Records the writes create_subtasks makes."""
+
+    def __init__(self, fail_insert=False):
+        self.fail_insert = fail_insert
+        self.calls = []
+
+    async def get_assignment(self, assignment_id):
+        return {"_id": assignment_id, "title": "Essay"}
+
+    async def get_user_preferences(self, user_id):
+        return {"studySettings": {"maxTaskDuration": 90}}
+
+    async def create_tasks(self, user_id, assignment_id, tasks_data):
+        self.calls.append("create_tasks")
+        if self.fail_insert:
+            raise RuntimeError("insert_many failed")
+        return [f"task{i}" for i in range(len(tasks_data))]
+
+    async def update_assignment(self, assignment_id, updates, user_id=None):
+        self.calls.append(("update_assignment", updates))
+        return {"_id": assignment_id, **updates}
+
+
+SUBTASKS = [
+    {"title": "Research", "estimated_duration": 60},
+    {"title": "Draft", "estimated_duration": 120},
+]
+
+
+def test_failed_insert_leaves_assignment_untouched():
+    db = FakeDatabase(fail_insert=True)
+    executor = FunctionExecutor(db, "u1")
+
+    result = asyncio.run(executor.create_subtasks("a1", SUBTASKS))
+
+    assert result["success"] is False
+    assert db.calls == ["create_tasks"]
+
+
+def test_total_hours_written_after_insert():
+    db = FakeDatabase()
+    executor = FunctionExecutor(db, "u1")
+
+    async def schedule_tasks(**kwargs):
+        return {"success": True, "scheduled_tasks": []}
+
+    executor.schedule_tasks = schedule_tasks
+
+    result = asyncio.run(executor.create_subtasks("a1", SUBTASKS))
+
+    assert result["success"] is True
+    assert db.calls == ["create_tasks", ("update_assignment", {"total_estimated_hours": 2.5})]
@@ -0,0 +1,33 @@
+"""
+Tests for the PDF worker helpers.
+"""
+
+import io
+
+import pytest
+
+pypdf = pytest.importorskip("pypdf")
+
+from utils.pdf_text import count_pages, extract_page_range
+
+
+def _blank_pdf(pages):
+    writer = pypdf.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=612, height=792)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def test_count_pages():
+    assert count_pages(_blank_pdf(6)) == 6
+
+
+def test_count_pages_rejects_non_pdf():
+    with pytest.raises(Exception):
+        count_pages(b"not a pdf")
+
+
+def test_extract_page_range_returns_one_entry_per_page():
+    assert extract_page_range(_blank_pdf(6), 2, 5) == ["", "", ""]
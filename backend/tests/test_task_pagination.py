@@ -0,0 +1,83 @@
+"""
+Tests for keyset pagination over a user's tasks.
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("motor")
+bson = pytest.importorskip("bson")
+
+from database.connection import Database, _decode_task_cursor, serialize_document
+
+
+def _matches(task, filters):
+    """Evaluate the subset of MongoDB filters get_user_tasks_page builds."""
+    for key, condition in filters.items():
+        if key == "$or":
+            if not any(_matches(task, branch) for branch in condition):
+                return False
+        elif isinstance(condition, dict):
+            if not task[key] < condition["$lt"]:
+                return False
+        elif task[key] != condition:
+            return False
+    return True
+
+
+def _database_with_tasks(tasks):
+    """A Database whose task aggregation runs over an in-memory list."""
+    db = Database()
+
+    async def find_tasks_with_assignment(filters, sort, limit, assignment_fields):
+        assert sort == {"created_at": -1, "_id": -1}
+        rows = sorted(
+            (dict(task) for task in tasks if _matches(task, filters)),
+            key=lambda task: (task["created_at"], task["_id"]),
+            reverse=True
+        )
+        return [(serialize_document(task), None) for task in rows[:limit]]
+
+    db._find_tasks_with_assignment = find_tasks_with_assignment
+    return db
+
+
+def test_pages_across_created_at_tie():
+    tied = datetime(2026, 3, 1, 9, 30)
+    tasks = [
+        {"_id": bson.ObjectId(), "user_id": "u1", "title": f"Task {i}",
+         "created_at": tied if 1 <= i <= 4 else datetime(2026, 3, i + 1)}
+        for i in range(7)
+    ]
+    db = _database_with_tasks(tasks)
+
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        page, cursor = asyncio.run(db.get_user_tasks_page("u1", cursor=cursor, page_size=3))
+        seen.extend(task["_id"] for task in page)
+        pages += 1
+        if cursor is None:
+            break
+
+    expected = sorted(tasks, key=lambda task: (task["created_at"], task["_id"]), reverse=True)
+    assert seen == [str(task["_id"]) for task in expected]
+    assert pages == 3
+
+
+@pytest.mark.parametrize("cursor", [
+    "garbage",
+    "2026-03-01T09:30:00_not-an-object-id",
+    "not-a-date_" + "a" * 24,
+    "_",
+])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        _decode_task_cursor(cursor)
+
+    db = _database_with_tasks([])
+    with pytest.raises(ValueError):
+        asyncio.run(db.get_user_tasks_page("u1", cursor=cursor))
@@ -0,0 +1,74 @@
+"""
+Tests for the deterministic paper/essay time estimates.
+"""
+
+import pytest
+
+from ai.time_estimates import estimate_writing_time
+
+
+@pytest.mark.parametrize("message", [
+    "How long will a 5 page essay take?",
+    "how much time does a 10-page paper take",
+    "Can you estimate a 3 page essay?",
+    "How long does a 20 page research paper usually take?",
+])
+def test_pure_estimate_question_is_answered(message):
+    reply = estimate_writing_time(message)
+
+    assert reply is not None
+    assert "page" in reply
+
+
+@pytest.mark.parametrize("message", [
+    # Extra requests after the question
+    "How long will my 10 page essay take? I want to plan it for next week",
+    "How long will a 5 page essay take and can you plan it for tomorrow",
+    "How long will a 5 page paper take, then remind me on Friday",
+    # Mutation intent
+    "How long will a 5 page essay take? Schedule it for me",
+    "Estimate a 5 page paper and add it to my calendar",
+    # Not a single-page-count paper/essay estimate
+    "How long is my reading for class?",
+    "Write me a 5 page essay",
+    "How long will 2.5 pages of essay take?",
+])
+def test_message_with_other_intent_goes_to_model(message):
+    assert estimate_writing_time(message) is None
+
+
+def test_recent_assignment_context_goes_to_model():
+    history = [
+        {"role": "user", "content": "I have a history essay on the Cold War due Friday"},
+        {"role": "model", "content": "Got it. Want me to break it down?"},
+    ]
+
+    assert estimate_writing_time("How long will a 5 page essay take?", history) is None
+
+
+def test_unrelated_older_context_is_ignored():
+    history = [
+        {"role": "user", "content": "I have a history essay due Friday"},
+        {"role": "model", "content": "Done."},
+        {"role": "user", "content": "What's on my calendar?"},
+        {"role": "model", "content": "You're free this afternoon."},
+        {"role": "user", "content": "Thanks"},
+        {"role": "model", "content": "Anytime!"},
+    ]
+
+    assert estimate_writing_time("How long will a 5 page essay take?", history) is not None
+
+
+def test_blocks_are_split_to_max_task_duration():
+    reply = estimate_writing_time("How long will a 10 page paper take?", max_task_duration=60)
+
+    assert "Research phase (part 1 of 2) (1 hour)" in reply
+    assert "Intro/conclusion & polish (part 2 of 2) (45 min)" in reply
+    assert "2 hours)" not in reply
+
+
+def test_blocks_within_max_task_duration_are_unchanged():
+    reply = estimate_writing_time("How long will a 5 page essay take?", max_task_duration=120)
+
+    assert "- Write draft (1.5 hours)" in reply
+    assert "part 1" not in reply
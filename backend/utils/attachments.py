@@ -0,0 +1,74 @@
+"""
+Chat Attachment Inlining
+
+Helpers for putting attachment text into a chat message once. After the
+first turn that carries an attachment's full text, later turns refer back
+to it for as long as that turn is still inside the model's history budget.
+"""
+
+import hashlib
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+
+def attachment_key(text: str) -> bytes:
+    """Content hash identifying an attachment's text."""
+    return hashlib.blake2b(text.encode(), digest_size=8).digest()
+
+
+def inline_attachments(
+    user_message: str,
+    attachments: List[Dict[str, Any]],
+    inlined_tokens: Dict[bytes, int]
+) -> Tuple[str, Set[bytes]]:
+    """
+    Build the message sent to the model, with attachment text inlined.
+
+    Args:
+        user_message: Text typed by the user
+        attachments: Attachment metadata from the client
+        inlined_tokens: Keys of attachment texts still in context (see carry_attachment_keys)
+
+    Returns:
+        Tuple of (augmented message, keys of the texts inlined in full this turn)
+    """
+    message_parts = [user_message] if user_message else []
+    turn_keys: Set[bytes] = set()
+    for attachment in attachments:
+        filename = attachment.get("filename", "attachment")
+        attachment_text = attachment.get("extracted_text") or attachment.get("preview")
+        if not attachment_text:
+            continue
+        key = attachment_key(attachment_text)
+        if key in turn_keys or key in inlined_tokens:
+            message_parts.append(f"[Attachment: {filename} (see above)]")
+        else:
+            message_parts.append(f"[Attachment: {filename}]\n{attachment_text}")
+            turn_keys.add(key)
+    return "\n\n".join(message_parts), turn_keys
+
+
+def carry_attachment_keys(
+    inlined_tokens: Dict[bytes, int],
+    turn_keys: Iterable[bytes],
+    turn_tokens: int,
+    max_tokens: int
+) -> Dict[bytes, int]:
+    """
+    Track which inlined attachment texts are still in the model's context.
+
+    Each key maps to the tokens of the conversation from the turn that
+    inlined its text through the latest turn. A key is kept, whether or not
+    later turns referred to it, while that span fits the history budget.
+
+    Args:
+        inlined_tokens: Result of the previous call ({} at the start)
+        turn_keys: Keys inlined in full this turn
+        turn_tokens: Estimated tokens of this turn's message and reply
+        max_tokens: History token budget
+
+    Returns:
+        Updated key -> tokens-since-inlined mapping
+    """
+    carried = {key: tokens + turn_tokens for key, tokens in inlined_tokens.items()}
+    carried.update((key, turn_tokens) for key in turn_keys)
+    return {key: tokens for key, tokens in carried.items() if tokens < max_tokens}
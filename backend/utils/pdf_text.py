@@ -0,0 +1,44 @@
+"""
+PDF Text Extraction
+
+Worker-side helpers for pulling text out of uploaded PDFs. These run in a
+process pool so pypdf's CPU-bound layout reconstruction never blocks the
+event loop.
+"""
+
+import io
+from typing import List
+
+from pypdf import PdfReader
+
+
+def count_pages(pdf_bytes: bytes) -> int:
+    """
+    Count the pages of a PDF.
+
+    Args:
+        pdf_bytes: Raw PDF file contents
+
+    Returns:
+        Number of pages
+    """
+    return len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+
+
+def extract_page_range(pdf_bytes: bytes, start: int, stop: int) -> List[str]:
+    """
+    Extract the text of pages [start, stop) from a PDF.
+
+    Args:
+        pdf_bytes: Raw PDF file contents
+        start: Index of the first page to extract
+        stop: Index one past the last page to extract
+
+    Returns:
+        Stripped text for each page in the range ("" for pages without text)
+    """
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    return [
+        (reader.pages[index].extract_text() or "").strip()
+        for index in range(start, stop)
+    ]
@@ -21,6 +21,7 @@ export interface ChatMessage {
     result: any;
   }>;
   attachments?: ChatAttachment[];
+  streaming?: boolean;
 }
 
 interface UseWebSocketReturn {
@@ -83,6 +84,22 @@ export function useWebSocket(userId: string | null): UseWebSocketReturn {
             // Backend connection confirmation - ignore, we handle this in onopen
             // This prevents duplicate "Connected" messages in chat
             return;
+          } else if (data.type === 'delta') {
+            // Streamed chunk: the server sends only new text, append it to the in-progress reply
+            setIsTyping(false);
+
+            setMessages((prev) => {
+              const last = prev[prev.length - 1];
+              if (last && last.role === 'model' && last.streaming) {
+                return [...prev.slice(0, -1), { ...last, content: last.content + data.delta }];
+              }
+              return [...prev, {
+                role: 'model',
+                content: data.delta,
+                timestamp: new Date().toISOString(),
+                streaming: true,
+              }];
+            });
           } else if (data.type === 'message' || data.message) {
             setIsTyping(false);
 
@@ -93,9 +110,16 @@ export function useWebSocket(userId: string | null): UseWebSocketReturn {
               function_calls: data.function_calls,
             };
 
-            setMessages((prev) => [...prev, newMessage]);
+            // The final message replaces any streamed preview of the same reply
+            setMessages((prev) => {
+              const last = prev[prev.length - 1];
+              const base = last && last.streaming ? prev.slice(0, -1) : prev;
+              return [...base, newMessage];
+            });
           } else if (data.type === 'error' || data.error) {
             setIsTyping(false);
+            // Keep any partial streamed text, but stop treating it as in progress
+            setMessages((prev) => prev.map((msg) => (msg.streaming ? { ...msg, streaming: false } : msg)));
             setError(data.error || 'An error occurred');
             console.error('WebSocket error:', data.error);
           }